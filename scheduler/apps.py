@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SchedulerConfig(AppConfig):
     name = 'scheduler'
+
+    def ready(self):
+        from . import signals  # noqa
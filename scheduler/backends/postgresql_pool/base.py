@@ -0,0 +1,126 @@
+# *****************************************************************************
+# scheduler/backends/postgresql_pool/base.py
+# *****************************************************************************
+
+import os
+import threading
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.base import Database
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from .pool import ConnectionPool, PoolTimeout
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def is_usable(connection):
+    try:
+        connection.cursor().execute('SELECT 1')
+    except Database.Error:
+        return False
+    return True
+
+
+def get_pool_stats(alias='default'):
+
+    """
+    returns the checkout and wait time counters of the pool of the alias in
+    this process, None when it has no pool
+
+    """
+
+    pool = _pools.get((os.getpid(), alias))
+    return None if pool is None else pool.stats.as_dict()
+
+
+# *****************************************************************************
+# DatabaseWrapper
+# *****************************************************************************
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    """
+    the PostgreSQL backend with connection health checks and an optional
+    in-process connection pool
+
+    with HEALTH_CHECKS set, a persistent connection is checked once per
+    request before its first query and replaced when the server dropped it.
+    with POOL['MAX_SIZE'] set, connections are checked out of a pool shared
+    by the threads of the process and closing them hands them back, so
+    CONN_MAX_AGE should be 0. pools are per process, a forked worker starts
+    its own
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_checks = self.settings_dict.get('HEALTH_CHECKS', False)
+        self.health_check_done = False
+        self.pool_options = self.settings_dict.get('POOL') or {}
+
+    def get_pool(self, conn_params):
+        options = self.pool_options
+        if not options.get('MAX_SIZE'):
+            return None
+
+        key = (os.getpid(), self.alias)
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ConnectionPool(
+                    lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                    max_size=options['MAX_SIZE'],
+                    timeout=options.get('TIMEOUT', 5),
+                    max_idle=options.get('MAX_IDLE'),
+                    health_check=is_usable if self.health_checks else None,
+                )
+            return _pools[key]
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        try:
+            connection = pool.acquire()
+        except PoolTimeout as e:
+            raise Database.OperationalError(str(e))
+
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+        return connection
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def ensure_connection(self):
+        # pooled connections are checked when checked out
+        if (self.connection is not None and self.health_checks and not self.health_check_done and
+                not self.in_atomic_block and not self.pool_options.get('MAX_SIZE')):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        # runs when requests start and finish
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def _close(self):
+        pool = _pools.get((os.getpid(), self.alias))
+        if pool is None:
+            return super()._close()
+
+        # a connection closed inside an atomic block stays referenced by this
+        # wrapper, so it is not handed to another thread
+        connection = self.connection
+        discard = bool(connection.closed) or self.in_atomic_block
+        if not discard and connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except Database.Error:
+                discard = True
+
+        pool.release(connection, discard=discard)
@@ -0,0 +1,181 @@
+# *****************************************************************************
+# scheduler/backends/postgresql_pool/pool.py
+# *****************************************************************************
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('scheduler.db.pool')
+
+# checkouts waiting longer than this are logged as warnings
+SLOW_WAIT = 0.1
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# *****************************************************************************
+# PoolStats
+# *****************************************************************************
+
+class PoolStats():
+
+    """
+    counts the checkouts of a ConnectionPool and the time spent waiting for
+    them
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.failed_checks = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, waited, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def increment(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'timeouts': self.timeouts,
+                'failed_checks': self.failed_checks,
+                'wait_total': self.wait_total,
+                'wait_max': self.wait_max,
+                'wait_mean': self.wait_total / max(self.checkouts + self.timeouts, 1),
+            }
+
+
+# *****************************************************************************
+# ConnectionPool
+# *****************************************************************************
+
+class ConnectionPool():
+
+    """
+    a bounded pool of database connections shared by the threads of a process
+
+    at most max_size connections are checked out at once, further checkouts
+    wait up to timeout seconds for one to be released. idle connections are
+    reused most recent first, closed once idle for longer than max_idle
+    seconds and passed to health_check, when given, before being handed out
+
+    """
+
+    def __init__(self, connect, max_size=10, timeout=5, max_idle=None, health_check=None):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.health_check = health_check
+        self.stats = PoolStats()
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def acquire(self):
+
+        """
+        returns an idle or new connection, raises PoolTimeout when none is
+        released within timeout seconds
+
+        """
+
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            waited = time.monotonic() - started
+            self.stats.record_wait(waited, timed_out=True)
+            logger.warning('no connection released within %.2fs, %d in use', waited, self.max_size)
+            raise PoolTimeout('no database connection available within {}s'.format(self.timeout))
+
+        waited = time.monotonic() - started
+        self.stats.record_wait(waited)
+        if waited > SLOW_WAIT:
+            logger.warning('waited %.3fs for a database connection', waited)
+
+        try:
+            connection = self.get_idle()
+            if connection is None:
+                connection = self.connect()
+                self.stats.increment('connects')
+        except BaseException:
+            self._slots.release()
+            raise
+
+        return connection
+
+    def get_idle(self):
+
+        """
+        returns the most recently released usable connection, closing the
+        expired and broken ones found before it
+
+        """
+
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, released = self._idle.pop()
+
+            if self.max_idle is not None and time.monotonic() - released > self.max_idle:
+                self.discard(connection)
+            elif self.health_check is not None and not self.health_check(connection):
+                self.stats.increment('failed_checks')
+                self.discard(connection)
+            else:
+                return connection
+
+    def release(self, connection, discard=False):
+
+        """
+        returns a checked out connection to the pool, closing it instead
+        when discard is set
+
+        """
+
+        try:
+            if discard:
+                self.discard(connection)
+            else:
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            logger.exception('failed to close a pooled connection')
+
+    def close(self):
+
+        """
+        closes the idle connections
+
+        """
+
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for connection, _ in idle:
+            self.discard(connection)
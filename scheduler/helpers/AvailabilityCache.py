@@ -0,0 +1,338 @@
+# *****************************************************************************
+# scheduler/helpers/AvailabilityCache.py
+# *****************************************************************************
+
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+
+from scheduler.helpers.AvailabilityEngine import AvailabilityEngine
+from scheduler.helpers.AvailabilityFetcher import AvailabilityFetcher
+from scheduler.helpers.LocalTimeTable import get_timezone
+from scheduler.helpers.Opening import to_micros
+from scheduler.models import InterviewCalendar, SlotOccurrence
+
+# conflicts spanning more days than this invalidate the whole calendar
+MAX_INVALIDATED_DAYS = 62
+
+# how long a day entry is locked while bookings are applied to it, and how
+# long to wait for the lock before recomputing the day instead
+DAY_LOCK_TIMEOUT = 10
+DAY_LOCK_WAIT = 0.1
+
+
+# *****************************************************************************
+# AvailabilityCache
+# *****************************************************************************
+
+class AvailabilityCache():
+
+    """
+    caches the Openings of each calendar day
+
+    entries are keyed by (calendar, date, calendar version, day version);
+    writes bump a version instead of deleting entries, so a conflict only
+    invalidates the days it covers while slot edits invalidate every day of
+    the calendar. bookings and cancellations do not invalidate anything,
+    the remaining spots of their occurrences are updated in place. the
+    booking horizon depends on the current time and is applied when entries
+    are read. missing days are computed from the replica like any read, but
+    only stored when the replica holds every committed write of the
+    calendar, see mark_replica_current
+
+    """
+
+    def __init__(self, alias=None, timeout=None):
+        self.alias = alias or getattr(settings, 'SCHEDULER_AVAILABILITY_CACHE', 'default')
+        self.timeout = timeout or getattr(settings, 'SCHEDULER_AVAILABILITY_CACHE_TIMEOUT', 24 * 60 * 60)
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def calendar_version_key(calendar_id):
+        return 'availability:{}:version'.format(calendar_id)
+
+    @staticmethod
+    def day_version_key(calendar_id, date):
+        return 'availability:{}:{}:version'.format(calendar_id, date.isoformat())
+
+    def get_versions(self, keys):
+
+        """
+        returns {key: version}, starting missing versions at a fresh token so
+        an evicted version never points at entries cached before it
+
+        """
+
+        versions = self.cache.get_many(keys)
+        missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+        if missing:
+            self.cache.set_many(missing, None)
+            versions.update(missing)
+
+        return versions
+
+    def get_entry_keys(self, calendar_id, dates):
+
+        """
+        returns {date: cache key} for the current versions of the dates
+
+        """
+
+        calendar_key = self.calendar_version_key(calendar_id)
+        day_keys = {date: self.day_version_key(calendar_id, date) for date in dates}
+        versions = self.get_versions([calendar_key] + list(day_keys.values()))
+
+        return {
+            date: self.entry_key(calendar_id, date, versions[calendar_key], versions[day_key])
+            for date, day_key in day_keys.items()
+        }
+
+    @staticmethod
+    def entry_key(calendar_id, date, calendar_version, day_version):
+        return 'availability:days:{}:{}:{}:{}'.format(
+            calendar_id, date.isoformat(), calendar_version, day_version,
+        )
+
+    def get_openings_by_date(self, calendar, start_date, end_date, now=None):
+
+        """
+        yields (date, Openings) pairs of the available slots, only computing
+        the days missing from the cache
+
+        """
+
+        engine = AvailabilityEngine(calendar, start_date, end_date, now=now)
+        dates = list(engine.dates())
+        if not dates:
+            return
+
+        # the replica is checked after the versions are read, see prefetch
+        keys = getattr(calendar, 'availability_keys', None) or {}
+        calendar.availability_keys = None
+        if not all(date in keys for date in dates):
+            keys = self.get_entry_keys(calendar.pk, dates)
+            calendar.replica_current = None
+        entries = self.cache.get_many(list(keys.values()))
+
+        missing = [date for date in dates if keys[date] not in entries]
+        if missing:
+            missing_engine = AvailabilityEngine(calendar, missing[0], missing[-1], now=engine.now)
+            computed = {
+                keys[date]: missing_engine.get_openings_for_date(date)
+                for date in missing
+            }
+            if getattr(calendar, 'replica_current', None) is None:
+                self.mark_replica_current([calendar])
+            if calendar.replica_current:
+                self.cache.set_many(computed, self.timeout)
+            entries.update(computed)
+
+        for date in dates:
+            openings = engine.filter_openings_within_limits(entries[keys[date]])
+            if openings:
+                yield date, openings
+
+    def prefetch(self, calendars, start_date, end_date, now=None):
+
+        """
+        prefetches availability data for the calendars missing any day of
+        the range from the cache, in a fixed number of queries per chunk of
+        calendars, see AvailabilityFetcher
+
+        the entry keys read here are kept on the calendars as
+        availability_keys for get_openings_by_date, so the replica is
+        checked after the versions the computed days are stored under
+
+        """
+
+        missing = []
+        for calendar in calendars:
+            dates = list(AvailabilityEngine(calendar, start_date, end_date, now=now).dates())
+            if not dates:
+                continue
+
+            keys = self.get_entry_keys(calendar.pk, dates)
+            calendar.availability_keys = keys
+            if len(self.cache.get_many(list(keys.values()))) < len(keys):
+                missing.append(calendar)
+
+        self.mark_replica_current(missing)
+        AvailabilityFetcher().fetch(missing, start_date, end_date)
+
+    def mark_replica_current(self, calendars):
+
+        """
+        sets replica_current on the calendars, true when their version read
+        from the replica matches the primary, in one query on the primary
+
+        every write moves the version in its transaction and the replica
+        applies transactions in order, so the availability data read after
+        a current calendar holds every write committed before the entry
+        versions were read. days computed while the replica lags are served
+        but not cached, they would be stored under the day versions already
+        moved by the writes it is missing
+
+        """
+
+        if not calendars:
+            return
+
+        if router.db_for_read(InterviewCalendar) == DEFAULT_DB_ALIAS:
+            for calendar in calendars:
+                calendar.replica_current = True
+            return
+
+        versions = dict(InterviewCalendar.objects.using(DEFAULT_DB_ALIAS).filter(
+            pk__in=[calendar.pk for calendar in calendars],
+        ).values_list('pk', 'version'))
+        for calendar in calendars:
+            calendar.replica_current = versions.get(calendar.pk) == calendar.version
+
+    def bump(self, keys):
+
+        """
+        moves the given version keys to fresh tokens, now and again once the
+        current transaction commits so readers cannot cache the state in
+        between under the new version
+
+        """
+
+        def set_versions():
+            self.cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+        set_versions()
+        transaction.on_commit(set_versions)
+
+    def invalidate_calendar(self, calendar_id):
+
+        """
+        invalidates every cached day of the calendar
+
+        """
+
+        self.bump([self.calendar_version_key(calendar_id)])
+
+    def update_occurrences(self, calendar, occurrences):
+
+        """
+        updates the remaining spots of the (slot id, start time) occurrences
+        in the cached days once the current transaction commits
+
+        """
+
+        local_tz = get_timezone(calendar.timezone)
+        days = defaultdict(set)
+        for slot_id, start_time in occurrences:
+            days[start_time.astimezone(local_tz).date()].add((slot_id, start_time))
+
+        def update_days():
+            for date, day_occurrences in days.items():
+                self.update_day(calendar.pk, date, day_occurrences)
+
+        if days:
+            transaction.on_commit(update_days)
+
+    def update_day(self, calendar_id, date, occurrences):
+
+        """
+        sets the remaining spots of the occurrences in the cached entry of
+        the date from their committed counters
+
+        the counters are read while the day is locked and the patched entry
+        is stored under a new day version, so concurrent updates cannot
+        overwrite each other and entries computed before the booking
+        committed are never read again
+
+        """
+
+        day_key = self.day_version_key(calendar_id, date)
+        lock_key = '{}:lock'.format(day_key)
+        token = uuid.uuid4().hex
+
+        deadline = time.time() + DAY_LOCK_WAIT
+        while not self.cache.add(lock_key, token, DAY_LOCK_TIMEOUT):
+            if time.time() > deadline:
+                self.bump([day_key])
+                return
+            time.sleep(0.005)
+
+        try:
+            calendar_key = self.calendar_version_key(calendar_id)
+            versions = self.get_versions([calendar_key, day_key])
+            entry = self.cache.get(self.entry_key(calendar_id, date, versions[calendar_key], versions[day_key]))
+
+            version = uuid.uuid4().hex
+            if entry is not None:
+                # a replica may not have the committed counters yet
+                rows = SlotOccurrence.objects.using(DEFAULT_DB_ALIAS).filter(
+                    slot_id__in={slot_id for slot_id, _ in occurrences},
+                    start_time__in={start_time for _, start_time in occurrences},
+                ).values_list('slot', 'start_time', 'booked')
+                booked = {(slot_id, to_micros(start_time)): count for slot_id, start_time, count in rows}
+                updated = {(slot_id, to_micros(start_time)) for slot_id, start_time in occurrences}
+
+                entry = [
+                    opening.with_remaining(opening.max_spots - booked.get((opening.slot_id, opening.start), 0))
+                    if (opening.slot_id, opening.start) in updated else opening
+                    for opening in entry
+                ]
+                self.cache.set(
+                    self.entry_key(calendar_id, date, versions[calendar_key], version),
+                    entry,
+                    self.timeout,
+                )
+
+            self.cache.set(day_key, version, None)
+        finally:
+            if self.cache.get(lock_key) == token:
+                self.cache.delete(lock_key)
+
+    def check_consistency(self, calendar, start_date, end_date):
+
+        """
+        returns the dates whose cached entry differs from a full recompute
+
+        """
+
+        engine = AvailabilityEngine(calendar, start_date, end_date)
+        dates = list(engine.dates())
+        if not dates:
+            return []
+
+        keys = self.get_entry_keys(calendar.pk, dates)
+        entries = self.cache.get_many(list(keys.values()))
+
+        return [
+            date for date in dates
+            if keys[date] in entries and entries[keys[date]] != engine.get_openings_for_date(date)
+        ]
+
+    def invalidate_range(self, calendar, start_time, end_time):
+
+        """
+        invalidates the calendar days touched by the range start - end
+
+        """
+
+        local_tz = get_timezone(calendar.timezone)
+        start_date = start_time.astimezone(local_tz).date()
+        end_date = end_time.astimezone(local_tz).date()
+
+        if (end_date - start_date).days > MAX_INVALIDATED_DAYS:
+            self.invalidate_calendar(calendar.pk)
+            return
+
+        keys = []
+        date = start_date
+        while date <= end_date:
+            keys.append(self.day_version_key(calendar.pk, date))
+            date = date + timedelta(days=1)
+        self.bump(keys)
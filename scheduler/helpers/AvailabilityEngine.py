@@ -0,0 +1,254 @@
+# *****************************************************************************
+# scheduler/helpers/AvailabilityEngine.py
+# *****************************************************************************
+
+from datetime import time, timedelta
+
+from django.utils import timezone
+
+from scheduler.enums import Weekday
+from scheduler.helpers.ConflictIndex import ConflictIndex
+from scheduler.helpers.LocalTimeTable import LocalTimeTable, get_timezone
+from scheduler.helpers.Opening import Opening, to_micros
+from scheduler.models import SlotOccurrence
+
+
+# *****************************************************************************
+# AvailabilityEngine
+# *****************************************************************************
+
+class AvailabilityEngine():
+
+    """
+    computes the available interview slots of a calendar for a date range
+
+    slots, conflicts and booked spots are loaded once for the whole
+    window and weekday recurrence is expanded in memory
+
+    """
+
+    def __init__(self, calendar, start_date, end_date, now=None, conflict_index=None,
+                 booked_counts=None):
+        self.calendar = calendar
+        self.now = now or timezone.now()
+        self.local_tz = get_timezone(calendar.timezone)
+
+        self.min_limit_time = self.now + timedelta(hours=calendar.min_hours_notice)
+        self.max_limit_time = self.now + timedelta(hours=calendar.max_hours_out)
+
+        # dates outside the booking horizon never have available slots
+        self.start_date = max(start_date, self.min_limit_time.astimezone(self.local_tz).date())
+        self.end_date = min(end_date, self.max_limit_time.astimezone(self.local_tz).date())
+        self.local_times = LocalTimeTable(self.local_tz, self.start_date, self.end_date)
+
+        self.window_start = self.localize(self.start_date, time.min)
+        self.window_end = self.localize(self.end_date + timedelta(days=1), time.min)
+
+        self._slots = None
+        self._conflicts = conflict_index
+        self._booked = booked_counts
+
+    def localize(self, date, slot_time):
+
+        """
+        combines date and time and returns calendar timezone aware datetime
+
+        """
+
+        return self.local_times.localize(date, slot_time)
+
+    def load(self):
+
+        """
+        fetch slots, window conflicts and booked spots in one query each,
+        unless InterviewCalendar.objects.prefetch_availability loaded them
+
+        """
+
+        if self._slots is not None:
+            return
+
+        slots = getattr(self.calendar, 'window_slots', None)
+        if slots is None:
+            slots = list(self.calendar.slots.order_by('id'))
+        self._slots = slots
+
+        if self._conflicts is None:
+            conflicts = getattr(self.calendar, 'window_conflicts', None)
+            if conflicts is None:
+                self._conflicts = ConflictIndex.for_calendar(
+                    self.calendar,
+                    now=self.now,
+                    start=self.window_start,
+                    end=self.window_end,
+                )
+            else:
+                self._conflicts = ConflictIndex(
+                    (conflict.start_time, conflict.end_time)
+                    for conflict in conflicts
+                )
+
+        if self._booked is None:
+            if all(hasattr(slot, 'window_occurrences') for slot in slots):
+                self._booked = {
+                    (slot.pk, occurrence.start_time): occurrence.booked
+                    for slot in slots
+                    for occurrence in slot.window_occurrences
+                }
+            else:
+                self._booked = SlotOccurrence.objects.filter(
+                    slot__calendar=self.calendar,
+                ).booked_counts(self.window_start, self.window_end)
+
+    def dates(self):
+
+        """
+        yields each date of the window within the booking horizon
+
+        """
+
+        date = self.start_date
+        while date <= self.end_date:
+            yield date
+            date = date + timedelta(days=1)
+
+    def is_within_limits(self, slot_start):
+
+        """
+        returns true if slot start respects min_hours_notice and max_hours_out
+
+        """
+
+        return self.min_limit_time <= slot_start <= self.max_limit_time
+
+    def is_conflicting(self, slot_start, slot_end):
+
+        """
+        returns true if any conflict overlaps the given slot occurrence
+
+        """
+
+        return self._conflicts.overlaps(slot_start, slot_end)
+
+    def is_full(self, slot, slot_start):
+
+        """
+        returns true if all spots of the slot occurrence are booked
+
+        """
+
+        booked = self._booked.get((slot.pk, slot_start), 0)
+        return booked >= slot.max_spots
+
+    def get_open_occurrences(self, date, include_full=False):
+
+        """
+        yields (slot, start, end) of the slot occurrences on date that are
+        neither full, unless include_full is set, nor conflicting, which does
+        not depend on the current time
+
+        """
+
+        self.load()
+        weekday = Weekday(date.weekday()).name
+
+        for slot in self._slots:
+            if not getattr(slot, weekday):
+                continue
+
+            slot_start = self.localize(date, slot.start_time)
+            slot_end = self.localize(date, slot.end_time)
+
+            if ((include_full or not self.is_full(slot, slot_start)) and
+                    not self.is_conflicting(slot_start, slot_end)):
+                yield slot, slot_start, slot_end
+
+    def get_open_slots_for_date(self, date):
+
+        """
+        returns slots on date that are neither full nor conflicting
+
+        """
+
+        return [slot for slot, _, _ in self.get_open_occurrences(date)]
+
+    def get_openings_for_date(self, date):
+
+        """
+        returns the Openings of the slots on date that are not conflicting,
+        full ones included with no remaining spots so that cached days can
+        follow bookings and cancellations
+
+        """
+
+        return [
+            Opening.from_row(
+                (slot.pk, slot.calendar_id, slot.max_spots),
+                slot_start,
+                slot_end,
+                self._booked.get((slot.pk, slot_start), 0),
+            )
+            for slot, slot_start, slot_end in self.get_open_occurrences(date, include_full=True)
+        ]
+
+    def filter_within_limits(self, date, slots):
+
+        """
+        returns the slots on date that start within the booking horizon
+
+        """
+
+        return [
+            slot for slot in slots
+            if self.is_within_limits(self.localize(date, slot.start_time))
+        ]
+
+    def filter_openings_within_limits(self, openings):
+
+        """
+        returns the openings with remaining spots that start within the
+        booking horizon
+
+        """
+
+        min_limit = to_micros(self.min_limit_time)
+        max_limit = to_micros(self.max_limit_time)
+
+        return [
+            opening for opening in openings
+            if opening.remaining > 0 and min_limit <= opening.start <= max_limit
+        ]
+
+    def get_slots_for_date(self, date):
+
+        """
+        returns available slots for particular date
+
+        """
+
+        return self.filter_within_limits(date, self.get_open_slots_for_date(date))
+
+    def get_slots_by_date(self):
+
+        """
+        yields (date, available slots) pairs for every date of the window
+
+        """
+
+        for date in self.dates():
+            slots = self.get_slots_for_date(date)
+            if slots:
+                yield date, slots
+
+    def get_openings_by_date(self):
+
+        """
+        yields (date, Openings) pairs of the bookable occurrences of every
+        date of the window
+
+        """
+
+        for date in self.dates():
+            openings = self.filter_openings_within_limits(self.get_openings_for_date(date))
+            if openings:
+                yield date, openings
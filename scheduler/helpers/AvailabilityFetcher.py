@@ -0,0 +1,124 @@
+# *****************************************************************************
+# scheduler/helpers/AvailabilityFetcher.py
+# *****************************************************************************
+
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, router
+from django.db.models import prefetch_related_objects
+
+from scheduler.models import InterviewCalendar, InterviewConflict, InterviewSlot, SlotOccurrence
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_concurrency():
+    return getattr(settings, 'SCHEDULER_FETCH_CONCURRENCY', 1)
+
+
+def get_pool():
+
+    """
+    returns the thread pool shared by every request, its size bounds the
+    queries running at once for the process
+
+    """
+
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(get_concurrency())
+        return _pool
+
+
+def run_query(queryset):
+
+    """
+    evaluates a queryset in a pool thread, opening and closing connections
+    as a request would
+
+    """
+
+    close_old_connections()
+    try:
+        return list(queryset)
+    finally:
+        close_old_connections()
+
+
+# *****************************************************************************
+# AvailabilityFetcher
+# *****************************************************************************
+
+class AvailabilityFetcher():
+
+    """
+    loads the slots, slot occurrences and conflicts of calendars for a date
+    range into the attributes set by InterviewCalendar.availability_prefetches
+
+    the three queries of each chunk of calendars run concurrently on pool
+    threads, each with its own connection, instead of one after the other.
+    pool threads cannot see the writes of an open transaction, so inside one
+    and when SCHEDULER_FETCH_CONCURRENCY is 1 the regular prefetches are used
+
+    """
+
+    def __init__(self, chunk_size=50):
+        self.chunk_size = chunk_size
+
+    def is_concurrent(self):
+        return get_concurrency() > 1 and not connection.in_atomic_block
+
+    def fetch(self, calendars, start_date, end_date):
+        calendars = list(calendars)
+        if not calendars:
+            return
+
+        if not self.is_concurrent():
+            prefetch_related_objects(
+                calendars,
+                *InterviewCalendar.availability_prefetches(start_date, end_date)
+            )
+            return
+
+        start, end = InterviewCalendar.availability_range(start_date, end_date)
+        pool = get_pool()
+
+        # pool threads do not share the routing state of this thread
+        db = router.db_for_read(InterviewSlot)
+
+        futures = []
+        for i in range(0, len(calendars), self.chunk_size):
+            calendar_ids = [calendar.pk for calendar in calendars[i:i + self.chunk_size]]
+            futures.append(tuple(pool.submit(run_query, queryset) for queryset in (
+                InterviewSlot.objects.using(db).filter(calendar_id__in=calendar_ids).order_by('id'),
+                SlotOccurrence.objects.using(db).filter(
+                    slot__calendar_id__in=calendar_ids,
+                    start_time__gte=start,
+                    start_time__lt=end,
+                ),
+                InterviewConflict.objects.using(db).filter(calendar_id__in=calendar_ids).overlapping(start, end),
+            )))
+
+        slots = defaultdict(list)
+        occurrences = defaultdict(list)
+        conflicts = defaultdict(list)
+        for slot_rows, occurrence_rows, conflict_rows in futures:
+            for slot in slot_rows.result():
+                slots[slot.calendar_id].append(slot)
+            for occurrence in occurrence_rows.result():
+                occurrences[occurrence.slot_id].append(occurrence)
+            for conflict in conflict_rows.result():
+                conflicts[conflict.calendar_id].append(conflict)
+
+        slot_cache_name = InterviewSlot._meta.get_field('calendar').get_cache_name()
+        for calendar in calendars:
+            calendar.window_slots = slots[calendar.pk]
+            calendar.window_conflicts = conflicts[calendar.pk]
+            for slot in calendar.window_slots:
+                setattr(slot, slot_cache_name, calendar)
+                slot.window_occurrences = occurrences[slot.pk]
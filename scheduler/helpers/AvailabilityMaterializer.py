@@ -0,0 +1,150 @@
+# *****************************************************************************
+# scheduler/helpers/AvailabilityMaterializer.py
+# *****************************************************************************
+
+from datetime import date, timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from scheduler.helpers.AvailabilityEngine import AvailabilityEngine
+from scheduler.helpers.LocalTimeTable import get_timezone
+from scheduler.helpers.Opening import Opening, from_micros
+from scheduler.models import AvailableOccurrence, InterviewCalendar
+
+
+def is_enabled():
+
+    """
+    returns whether calendar reads use the materialized availability
+
+    """
+
+    return getattr(settings, 'SCHEDULER_MATERIALIZED_AVAILABILITY', False)
+
+
+# *****************************************************************************
+# AvailabilityMaterializer
+# *****************************************************************************
+
+class AvailabilityMaterializer():
+
+    """
+    keeps the available slot occurrences of calendars in AvailableOccurrence
+
+    a refresh stores the openings of every day of the booking horizon along
+    with the calendar version it was computed from and the end of its last
+    day. reads only use the rows while the version is unchanged and the
+    horizon still ends within them, any other calendar is computed on the
+    request path as before
+
+    """
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+
+    def refresh(self, calendar):
+
+        """
+        recomputes the AvailableOccurrence rows of the calendar, returns the
+        number of rows stored
+
+        """
+
+        # read the version first, writes committed during the computation
+        # leave the calendar stale for the next refresh
+        version = InterviewCalendar.objects.filter(pk=calendar.pk).values_list('version', flat=True).get()
+
+        # the engine narrows the dates to the booking horizon
+        engine = AvailabilityEngine(calendar, date.min, date.max, now=self.now)
+        occurrences = [
+            AvailableOccurrence(
+                calendar_id=calendar.pk,
+                slot_id=opening.slot_id,
+                date=day,
+                start_time=from_micros(opening.start),
+                end_time=from_micros(opening.end),
+                max_spots=opening.max_spots,
+                remaining=opening.remaining,
+            )
+            for day in engine.dates()
+            for opening in engine.get_openings_for_date(day)
+            if opening.remaining
+        ]
+
+        with transaction.atomic():
+            AvailableOccurrence.objects.filter(calendar_id=calendar.pk).delete()
+            AvailableOccurrence.objects.bulk_create(occurrences)
+
+            # a queryset update sends no signal, which would move the version
+            InterviewCalendar.objects.filter(pk=calendar.pk).update(
+                materialized_version=version,
+                materialized_until=engine.window_end,
+            )
+
+        calendar.materialized_version = version
+        calendar.materialized_until = engine.window_end
+        return len(occurrences)
+
+    def is_fresh(self, calendar):
+
+        """
+        returns whether the rows of the calendar match its version and cover
+        its current booking horizon
+
+        """
+
+        return (
+            calendar.materialized_version == calendar.version and
+            calendar.materialized_until is not None and
+            self.now + timedelta(hours=calendar.max_hours_out) < calendar.materialized_until
+        )
+
+    def needs_refresh(self, calendar, interval):
+
+        """
+        returns whether the calendar is stale or will stop covering its
+        horizon within interval seconds
+
+        """
+
+        return (
+            calendar.materialized_version != calendar.version or
+            calendar.materialized_until is None or
+            self.now + timedelta(hours=calendar.max_hours_out, seconds=interval) >= calendar.materialized_until
+        )
+
+    def get_openings_by_date(self, calendar, start_date, end_date):
+
+        """
+        yields (date, Openings) pairs of the available slots from the rows of
+        a fresh calendar, in one indexed query
+
+        """
+
+        min_limit_time = self.now + timedelta(hours=calendar.min_hours_notice)
+        max_limit_time = self.now + timedelta(hours=calendar.max_hours_out)
+        local_tz = get_timezone(calendar.timezone)
+
+        rows = AvailableOccurrence.objects.filter(
+            calendar_id=calendar.pk,
+            date__gte=start_date,
+            date__lte=end_date,
+            start_time__gte=min_limit_time,
+            start_time__lte=max_limit_time,
+        ).order_by('date', 'slot_id').values_list(
+            'date', 'slot_id', 'start_time', 'end_time', 'max_spots', 'remaining',
+        )
+
+        for day, day_rows in groupby(rows, key=lambda row: row[0]):
+            yield day, [
+                Opening.from_row(
+                    (slot_id, calendar.pk, max_spots),
+                    start_time.astimezone(local_tz),
+                    end_time.astimezone(local_tz),
+                    max_spots - remaining,
+                )
+                for _, slot_id, start_time, end_time, max_spots, remaining in day_rows
+            ]
@@ -0,0 +1,172 @@
+# *****************************************************************************
+# scheduler/helpers/AvailabilityMatrix.py
+# *****************************************************************************
+
+from datetime import time
+
+from scheduler.enums import Weekday
+from scheduler.helpers.AvailabilityEngine import AvailabilityEngine
+from scheduler.helpers.Opening import Opening, to_micros
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def time_to_micros(local_time):
+    return ((local_time.hour * 60 + local_time.minute) * 60 + local_time.second) * 10 ** 6 + \
+        local_time.microsecond
+
+
+# *****************************************************************************
+# AvailabilityMatrix
+# *****************************************************************************
+
+class AvailabilityMatrix(AvailabilityEngine):
+
+    """
+    batch mode of AvailabilityEngine for long windows
+
+    every (slot, date) candidate of the window is a cell of epoch microsecond
+    arrays, so the weekday, booking horizon, conflict and capacity checks run
+    as a handful of NumPy operations instead of per occurrence Python calls.
+    the export computes its Openings this way, see AvailabilityPool. falls
+    back to AvailabilityEngine when NumPy is not installed
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._available = None
+        self._booked_spots = None
+
+    def get_local_starts(self, dates, times):
+
+        """
+        returns the (time, date) matrix of epoch microseconds of each local
+        time on each date
+
+        """
+
+        midnights = np.array(
+            [to_micros(self.localize(date, time.min)) for date in dates],
+            dtype=np.int64,
+        )
+        times = np.array([time_to_micros(local_time) for local_time in times], dtype=np.int64)
+        return midnights[np.newaxis, :] + times[:, np.newaxis]
+
+    def compute(self):
+
+        """
+        returns (dates, available) where available[i, j] is true when the
+        i-th slot is available on the j-th date
+
+        """
+
+        if self._available is not None:
+            return self._available
+
+        self.load()
+        dates = list(self.dates())
+        slots = self._slots
+
+        if not dates or not slots:
+            self._booked_spots = np.zeros((len(slots), len(dates)), dtype=np.int64)
+            self._available = dates, np.zeros((len(slots), len(dates)), dtype=bool)
+            return self._available
+
+        starts = self.get_local_starts(dates, [slot.start_time for slot in slots])
+        ends = self.get_local_starts(dates, [slot.end_time for slot in slots])
+
+        # a DST transition shifts the offset within the date, localize
+        # those occurrences one by one
+        for j, date in enumerate(dates):
+            if date not in self.local_times.tzinfos:
+                for i, slot in enumerate(slots):
+                    starts[i, j] = to_micros(self.localize(date, slot.start_time))
+                    ends[i, j] = to_micros(self.localize(date, slot.end_time))
+
+        weekdays = np.array([
+            [getattr(slot, weekday.name) for weekday in Weekday]
+            for slot in slots
+        ], dtype=bool)
+        available = weekdays[:, [date.weekday() for date in dates]]
+
+        available &= starts >= to_micros(self.min_limit_time)
+        available &= starts <= to_micros(self.max_limit_time)
+
+        conflicts = self._conflicts
+        if len(conflicts):
+            conflict_starts = np.array([to_micros(dt) for dt in conflicts.starts], dtype=np.int64)
+            conflict_ends = np.array([to_micros(dt) for dt in conflicts.max_ends], dtype=np.int64)
+            i = np.searchsorted(conflict_starts, ends, side='left')
+            available &= ~((i > 0) & (conflict_ends[np.maximum(i - 1, 0)] > starts))
+
+        # occurrences without a counter have no booked spots
+        rows = {slot.pk: i for i, slot in enumerate(slots)}
+        booked = np.zeros(starts.shape, dtype=np.int64)
+        booked_keys = sorted(
+            (rows[slot_id], to_micros(start_time), count)
+            for (slot_id, start_time), count in self._booked.items()
+            if slot_id in rows
+        )
+        if booked_keys:
+            slot_rows, booked_starts, counts = (np.array(column, dtype=np.int64)
+                                                for column in zip(*booked_keys))
+            for i in np.unique(slot_rows):
+                row = slot_rows == i
+                positions = np.searchsorted(booked_starts[row], starts[i])
+                positions = np.minimum(positions, row.sum() - 1)
+                matches = booked_starts[row][positions] == starts[i]
+                booked[i] = np.where(matches, counts[row][positions], 0)
+
+        max_spots = np.array([slot.max_spots for slot in slots], dtype=np.int64)
+        available &= booked < max_spots[:, np.newaxis]
+
+        self._booked_spots = booked
+        self._available = dates, available
+        return self._available
+
+    def get_slots_by_date(self):
+
+        """
+        yields (date, available slots) pairs for every date of the window
+
+        """
+
+        if np is None:
+            yield from super().get_slots_by_date()
+            return
+
+        dates, available = self.compute()
+        for j, date in enumerate(dates):
+            rows = np.flatnonzero(available[:, j])
+            if len(rows):
+                yield date, [self._slots[i] for i in rows]
+
+    def get_openings_by_date(self):
+
+        """
+        yields (date, Openings) pairs of the bookable occurrences of every
+        date of the window
+
+        """
+
+        if np is None:
+            yield from super().get_openings_by_date()
+            return
+
+        dates, available = self.compute()
+        for j, date in enumerate(dates):
+            rows = np.flatnonzero(available[:, j])
+            if len(rows):
+                yield date, [
+                    Opening.from_row(
+                        (self._slots[i].pk, self._slots[i].calendar_id, self._slots[i].max_spots),
+                        self.localize(date, self._slots[i].start_time),
+                        self.localize(date, self._slots[i].end_time),
+                        int(self._booked_spots[i, j]),
+                    )
+                    for i in rows
+                ]
@@ -0,0 +1,89 @@
+# *****************************************************************************
+# scheduler/helpers/AvailabilityPool.py
+# *****************************************************************************
+
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections
+from django.utils import timezone
+
+from scheduler.helpers.AvailabilityMatrix import AvailabilityMatrix
+from scheduler.models import InterviewCalendar
+
+
+def compute_chunk(calendar_ids, start_date, end_date, now):
+
+    """
+    returns [(calendar id, [(date, Openings)])] for the calendars, loading
+    their slots, conflicts and booked spots in a fixed number of queries and
+    computing each calendar in batch with AvailabilityMatrix
+
+    """
+
+    calendars = InterviewCalendar.objects.filter(
+        pk__in=calendar_ids,
+    ).prefetch_availability(start_date, end_date).in_bulk()
+
+    results = []
+    for calendar_id in calendar_ids:
+        calendar = calendars.get(calendar_id)
+        if calendar is None:
+            continue
+
+        engine = AvailabilityMatrix(calendar, start_date, end_date, now=now)
+        results.append((calendar_id, list(engine.get_openings_by_date())))
+
+    return results
+
+
+# *****************************************************************************
+# AvailabilityPool
+# *****************************************************************************
+
+class AvailabilityPool():
+
+    """
+    computes the availability of many calendars across worker processes
+
+    calendars are sent to the workers in chunks and their results come
+    back in the order of the calendar ids. the database connections of
+    the parent are closed before the workers fork so that each worker
+    opens its own. with a single worker everything runs in this process
+
+    """
+
+    def __init__(self, workers=None, chunk_size=50, now=None):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.now = now or timezone.now()
+
+    def chunks(self, calendar_ids):
+        calendar_ids = list(calendar_ids)
+        for i in range(0, len(calendar_ids), self.chunk_size):
+            yield calendar_ids[i:i + self.chunk_size]
+
+    def map(self, calendar_ids, start_date, end_date):
+
+        """
+        yields (calendar id, [(date, Openings)]) pairs in the order of
+        calendar_ids, skipping unknown calendars
+
+        """
+
+        chunks = self.chunks(calendar_ids)
+
+        if self.workers == 1:
+            for chunk in chunks:
+                yield from compute_chunk(chunk, start_date, end_date, self.now)
+            return
+
+        # forked workers must not share the sockets of the parent
+        connections.close_all()
+
+        with ProcessPoolExecutor(self.workers) as pool:
+            futures = [
+                pool.submit(compute_chunk, chunk, start_date, end_date, self.now)
+                for chunk in chunks
+            ]
+            for future in futures:
+                yield from future.result()
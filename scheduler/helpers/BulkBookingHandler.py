@@ -0,0 +1,165 @@
+# *****************************************************************************
+# scheduler/helpers/BulkBookingHandler.py
+# *****************************************************************************
+
+from collections import defaultdict
+
+from django.db import transaction
+
+from scheduler.helpers.AvailabilityCache import AvailabilityCache
+from scheduler.helpers.ConflictIndex import MAX_SLOT_LENGTH, ConflictIndex
+from scheduler.helpers.InterviewScheduleHandler import InterviewScheduleHandler
+from scheduler.models import (
+    Interview,
+    InterviewCalendar,
+    InterviewConflict,
+    InterviewSlot,
+    SlotOccurrence,
+)
+from scheduler.routers import use_primary
+
+# largest number of interviews accepted in one bulk request
+MAX_BULK_BOOKINGS = 1000
+
+SLOT_NOT_FOUND = 'Interview slot does not exist'
+UNAVAILABLE = 'Interview time is no longer available'
+
+
+# *****************************************************************************
+# BulkBookingHandler
+# *****************************************************************************
+
+class BulkBookingHandler():
+
+    """
+    books many interviews against one availability snapshot
+
+    the slots, conflicts and occurrence counters of the whole batch are loaded
+    in three queries and every request is checked by InterviewScheduleHandler
+    against them, counting the spots taken by earlier requests of the batch.
+    the spots are then reserved per slot occurrence and the interviews are
+    inserted with a single bulk_create, all in one transaction
+
+    """
+
+    def __init__(self, requests):
+        # validated InterviewSerializer data, each with slot_id and start_time
+        self.requests = requests
+
+    def load(self):
+        slot_ids = {request['slot_id'] for request in self.requests}
+        self.slots = InterviewSlot.objects.select_related('calendar').in_bulk(slot_ids)
+        self.conflict_indexes = {}
+        self.booked_counts = {}
+
+        start_times = [request['start_time'] for request in self.requests]
+        if not self.slots or not start_times:
+            return
+
+        window_start = min(start_times) - MAX_SLOT_LENGTH
+        window_end = max(start_times) + MAX_SLOT_LENGTH
+
+        calendar_ids = {slot.calendar_id for slot in self.slots.values()}
+        conflicts = defaultdict(list)
+        rows = InterviewConflict.objects.filter(calendar__in=calendar_ids).overlapping(
+            window_start, window_end,
+        ).values_list('calendar', 'start_time', 'end_time')
+        for calendar_id, start_time, end_time in rows:
+            conflicts[calendar_id].append((start_time, end_time))
+        self.conflict_indexes = {
+            calendar_id: ConflictIndex(conflicts[calendar_id])
+            for calendar_id in calendar_ids
+        }
+
+        self.booked_counts = SlotOccurrence.objects.filter(
+            slot__in=self.slots.values(),
+        ).booked_counts(window_start, window_end)
+
+    def check(self):
+
+        """
+        returns the requested (slot id, start time) of each request, or None
+        for those that cannot be booked, counting the batch itself against
+        the capacity of each slot
+
+        """
+
+        keys = []
+        for request in self.requests:
+            slot = self.slots.get(request['slot_id'])
+            if slot is None:
+                keys.append(None)
+                continue
+
+            handler = InterviewScheduleHandler(
+                request['start_time'],
+                slot,
+                conflict_index=self.conflict_indexes[slot.calendar_id],
+                booked_counts=self.booked_counts,
+            )
+            if not handler.is_available():
+                keys.append(None)
+                continue
+
+            key = (slot.pk, request['start_time'])
+            self.booked_counts[key] = self.booked_counts.get(key, 0) + 1
+            keys.append(key)
+
+        return keys
+
+    def book(self):
+
+        """
+        returns a list of (interview, error) pairs in request order
+
+        """
+
+        # the snapshot is checked against the primary
+        with use_primary():
+            self.load()
+            keys = self.check()
+
+        results = [
+            (None, UNAVAILABLE if request['slot_id'] in self.slots else SLOT_NOT_FOUND)
+            for request in self.requests
+        ]
+
+        counts = defaultdict(int)
+        for key in keys:
+            if key is not None:
+                counts[key] += 1
+
+        with transaction.atomic():
+            # spots taken by concurrent bookings since the snapshot are
+            # refused to the last requests of their occurrence
+            taken = SlotOccurrence.objects.reserve_many(self.slots, counts)
+
+            interviews = []
+            for position, (request, key) in enumerate(zip(self.requests, keys)):
+                if key is None or not taken[key]:
+                    continue
+                taken[key] -= 1
+
+                data = dict(request)
+                slot = self.slots[data.pop('slot_id')]
+                data.pop('calendar', None)
+                interview = Interview(calendar=slot.calendar, slot=slot, **data)
+                interview.spot_reserved = True
+                interviews.append(interview)
+                results[position] = (interview, None)
+
+            # bulk_create sends no post_save signals, update the cache explicitly
+            Interview.objects.bulk_create(interviews)
+            booked_occurrences = defaultdict(list)
+            for interview in interviews:
+                booked_occurrences[interview.calendar].append((interview.slot_id, interview.start_time))
+            for calendar, occurrences in booked_occurrences.items():
+                AvailabilityCache().update_occurrences(calendar, occurrences)
+
+            # one calendar per update in id order, after the spots are taken,
+            # so concurrent batches never wait on each other's calendar rows
+            # in a cycle
+            for calendar in sorted(booked_occurrences, key=lambda calendar: calendar.pk):
+                InterviewCalendar.objects.filter(pk=calendar.pk).touch()
+
+        return results
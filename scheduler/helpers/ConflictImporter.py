@@ -0,0 +1,152 @@
+# *****************************************************************************
+# scheduler/helpers/ConflictImporter.py
+# *****************************************************************************
+
+from collections import OrderedDict, defaultdict
+
+from django.db import connections, router, transaction
+
+from scheduler.helpers.AvailabilityCache import AvailabilityCache
+from scheduler.models import InterviewCalendar, InterviewConflict
+
+# largest number of conflict ids deleted by one statement
+DELETE_CHUNK_SIZE = 500
+
+
+def coalesce(intervals):
+
+    """
+    returns the sorted, disjoint (start, end) intervals covering the given
+    intervals, merging those that overlap or touch
+
+    """
+
+    merged = []
+    for start, end in sorted((min(start, end), max(start, end)) for start, end in intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return [(start, end) for start, end in merged]
+
+
+# *****************************************************************************
+# ConflictImporter
+# *****************************************************************************
+
+class ConflictImporter():
+
+    """
+    imports conflict intervals, keeping each calendar's conflicts disjoint
+
+    imported intervals are coalesced with each other and with the stored
+    conflicts they overlap or touch, then the absorbed rows are deleted and
+    the merged ones inserted with one bulk query each per calendar
+
+    """
+
+    def __init__(self):
+        self.intervals = defaultdict(list)
+        self.received = 0
+
+    def add(self, calendar_id, start_time, end_time):
+        self.intervals[calendar_id].append((start_time, end_time))
+        self.received += 1
+
+    def load_touching(self, calendar_id, intervals):
+
+        """
+        returns [((start, end), pk)] of the stored conflicts of the calendar
+        that overlap or touch the intervals, directly or through each other
+
+        """
+
+        start, end = intervals[0][0], intervals[-1][1]
+        while True:
+            rows = InterviewConflict.objects.select_for_update().filter(
+                calendar_id=calendar_id,
+                start_time__lte=end,
+                end_time__gte=start,
+            ).values_list('pk', 'start_time', 'end_time')
+            existing = [((row_start, row_end), pk) for pk, row_start, row_end in rows]
+
+            # stored conflicts sticking out of the range may touch others
+            span = coalesce(intervals + [interval for interval, _ in existing])
+            if (span[0][0], span[-1][1]) == (start, end):
+                return existing
+            start, end = span[0][0], span[-1][1]
+
+    def delete(self, pks):
+
+        """
+        deletes the conflicts with the given ids without the per row signals
+        of QuerySet.delete, in one statement per chunk of ids
+
+        """
+
+        connection = connections[router.db_for_write(InterviewConflict)]
+        sql = 'DELETE FROM {} WHERE {} IN ({{}})'.format(
+            connection.ops.quote_name(InterviewConflict._meta.db_table),
+            connection.ops.quote_name(InterviewConflict._meta.pk.column),
+        )
+
+        with connection.cursor() as cursor:
+            for i in range(0, len(pks), DELETE_CHUNK_SIZE):
+                chunk = pks[i:i + DELETE_CHUNK_SIZE]
+                cursor.execute(sql.format(', '.join(['%s'] * len(chunk))), chunk)
+
+    def save(self):
+
+        """
+        stores the imported intervals, returns the number of received,
+        created and deleted conflicts
+
+        """
+
+        stats = OrderedDict([('received', self.received), ('created', 0), ('deleted', 0)])
+        calendars = InterviewCalendar.objects.in_bulk(list(self.intervals))
+        unknown = sorted(set(self.intervals) - set(calendars))
+        if unknown:
+            raise InterviewCalendar.DoesNotExist(
+                'Unknown calendars: {}'.format(', '.join(str(pk) for pk in unknown)),
+            )
+
+        for calendar_id, intervals in sorted(self.intervals.items()):
+            intervals = coalesce(intervals)
+
+            with transaction.atomic():
+                existing = self.load_touching(calendar_id, intervals)
+                merged = coalesce(intervals + [interval for interval, _ in existing])
+
+                # keep one stored row per merged interval, duplicates included
+                kept = dict.fromkeys(merged)
+                stale = []
+                for interval, pk in existing:
+                    if interval in kept and kept[interval] is None:
+                        kept[interval] = pk
+                    else:
+                        stale.append(pk)
+                created = [interval for interval, pk in kept.items() if pk is None]
+
+                # bulk queries send no per row signals, the touched days are
+                # invalidated below
+                self.delete(stale)
+                InterviewConflict.objects.bulk_create([
+                    InterviewConflict(calendar_id=calendar_id, start_time=start, end_time=end)
+                    for start, end in created
+                ])
+
+                if created:
+                    AvailabilityCache().invalidate_range(
+                        calendars[calendar_id],
+                        min(start for start, _ in created),
+                        max(end for _, end in created),
+                    )
+                if created or stale:
+                    InterviewCalendar.objects.filter(pk=calendar_id).touch()
+
+            stats['created'] += len(created)
+            stats['deleted'] += len(stale)
+
+        return stats
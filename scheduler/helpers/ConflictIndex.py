@@ -0,0 +1,93 @@
+# *****************************************************************************
+# scheduler/helpers/ConflictIndex.py
+# *****************************************************************************
+
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.utils import timezone
+
+# an interview slot never spans more than a day, so conflicts starting up to a
+# day after the last bookable slot start can still overlap it
+MAX_SLOT_LENGTH = timedelta(days=1)
+
+
+# *****************************************************************************
+# ConflictIndex
+# *****************************************************************************
+
+class ConflictIndex():
+
+    """
+    sorted interval index over a calendar's conflicts
+
+    conflicts are sorted by start time alongside the running maximum of their
+    end times, so whether any conflict overlaps a range is answered with a
+    single binary search
+
+    """
+
+    def __init__(self, intervals):
+        self.starts = []
+        self.max_ends = []
+
+        max_end = None
+        for start, end in sorted(intervals):
+            max_end = end if max_end is None else max(max_end, end)
+            self.starts.append(start)
+            self.max_ends.append(max_end)
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def for_calendar(cls, calendar, now=None, start=None, end=None):
+
+        """
+        builds the index from the conflicts from start, the start of the
+        calendar's booking horizon by default, up to the end of the horizon,
+        optionally narrowed to end
+
+        slots of a day starting before the horizon are computed too, see
+        AvailabilityEngine.get_openings_for_date, so an explicit start is
+        kept as is
+
+        """
+
+        now = now or timezone.now()
+        if start is None:
+            start = now + timedelta(hours=calendar.min_hours_notice)
+
+        horizon_end = now + timedelta(hours=calendar.max_hours_out) + MAX_SLOT_LENGTH
+        if end is not None:
+            horizon_end = min(horizon_end, end)
+
+        return cls.for_range(calendar, start, horizon_end)
+
+    @classmethod
+    def for_range(cls, calendar, start, end):
+
+        """
+        builds the index from the calendar's conflicts overlapping the range
+        start - end
+
+        """
+
+        if start >= end:
+            return cls([])
+
+        return cls(calendar.conflicts.overlapping(
+            start,
+            end,
+        ).values_list('start_time', 'end_time'))
+
+    def overlaps(self, start, end):
+
+        """
+        returns true if any conflict overlaps the range start - end
+
+        """
+
+        # conflicts before index i are exactly those starting before end
+        i = bisect_left(self.starts, end)
+        return i > 0 and self.max_ends[i - 1] > start
@@ -1,12 +1,14 @@
-import calendar
 from datetime import timedelta, datetime
-from scheduler.models import Interview, InterviewConflict
+from scheduler.enums import Weekday
+from scheduler.models import SlotOccurrence
 
 
 class InterviewScheduleHandler():
-    def __init__(self, interview_datetime, interview_slot):
+    def __init__(self, interview_datetime, interview_slot, conflict_index=None, booked_counts=None):
         self.interview_datetime = interview_datetime
         self.interview_slot = interview_slot
+        self.conflict_index = conflict_index
+        self.booked_counts = booked_counts
 
     def is_available(self):
 
@@ -28,18 +30,7 @@ class InterviewScheduleHandler():
         returns true if interview date falls on a day of week for which the given interview slot is valid
 
         """
-        validation_result = False
-        interview_day = calendar.day_name[interview_date.weekday()][:3]
-        if interview_day == 'Mon':
-            validation_result = self.interview_slot.monday
-        elif interview_day == 'Tue':
-            validation_result = self.interview_slot.tuesday
-        elif interview_day == 'Wed':
-            validation_result = self.interview_slot.wednesday
-        elif interview_day == 'Thu':
-            validation_result = self.interview_slot.thursday
-        elif interview_day == 'Fri':
-            validation_result = self.interview_slot.friday
+        validation_result = getattr(self.interview_slot, Weekday(interview_date.weekday()).name)
 
         if not validation_result:
             print("check 1 fail. No Interview Slot available on given day")
@@ -69,10 +60,14 @@ class InterviewScheduleHandler():
         returns true if no. of interviews scheduled in given slot is less than max no. of spots
 
         """
-        interviews = Interview.objects.filter(calendar=self.interview_slot.calendar, canceled=False,
-                                              start_time=self.interview_datetime)
+        if self.booked_counts is not None:
+            booked = self.booked_counts.get((self.interview_slot.pk, self.interview_datetime), 0)
+        else:
+            occurrence = SlotOccurrence.objects.filter(slot=self.interview_slot,
+                                                       start_time=self.interview_datetime).first()
+            booked = occurrence.booked if occurrence else 0
 
-        validation_result = (interviews.count() <= self.interview_slot.max_spots)
+        validation_result = (booked < self.interview_slot.max_spots)
         if not validation_result:
             print("Check #3 fail. Interview slot is full!!")
         return validation_result
@@ -83,20 +78,18 @@ class InterviewScheduleHandler():
         returns true if no interview conflicts occur with the given interview slot
 
         """
-        validation_result = True
-        interview_conflicts = InterviewConflict.objects.filter(calendar=self.interview_slot.calendar)
         interview_slot_start_time = self.localize_time(interview_date, self.interview_slot.start_time)
         interview_slot_end_time = self.localize_time(interview_date, self.interview_slot.end_time)
 
-        for interview_conflict in interview_conflicts:
-            conflict_start_time = interview_conflict.start_time.astimezone(self.interview_slot.local_tz)
-            conflict_end_time = interview_conflict.end_time.astimezone(self.interview_slot.local_tz)
+        if self.conflict_index is not None:
+            validation_result = not self.conflict_index.overlaps(interview_slot_start_time,
+                                                                 interview_slot_end_time)
+        else:
+            validation_result = not self.interview_slot.calendar.conflicts.overlapping(
+                interview_slot_start_time, interview_slot_end_time).exists()
 
-            if not (((conflict_start_time < interview_slot_start_time) and (conflict_end_time <= interview_slot_start_time)) or
-                        ((conflict_start_time >= interview_slot_end_time) and (conflict_end_time > interview_slot_end_time))):
-                validation_result = False
-                print('Slot is Conflicting')
-                break
+        if not validation_result:
+            print('Slot is Conflicting')
         return validation_result
 
 
@@ -0,0 +1,63 @@
+# *****************************************************************************
+# scheduler/helpers/LocalTimeTable.py
+# *****************************************************************************
+
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+
+import pytz
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name):
+
+    """
+    returns the pytz timezone for name, looked up once per process
+
+    """
+
+    return pytz.timezone(name)
+
+
+# *****************************************************************************
+# LocalTimeTable
+# *****************************************************************************
+
+class LocalTimeTable():
+
+    """
+    precomputed UTC offsets of a timezone for each date of a window
+
+    dates with a single UTC offset from midnight to midnight map to the pytz
+    tzinfo of that offset, so localizing a time on them is a dict lookup and
+    a replace. dates containing a DST transition fall back to tz.localize
+
+    """
+
+    def __init__(self, tz, start_date, end_date):
+        self.tz = tz
+        self.tzinfos = {}
+
+        date = start_date
+        midnight = tz.localize(datetime.combine(date, time.min))
+        while date <= end_date:
+            next_date = date + timedelta(days=1)
+            next_midnight = tz.localize(datetime.combine(next_date, time.min))
+
+            if midnight.utcoffset() == next_midnight.utcoffset():
+                self.tzinfos[date] = midnight.tzinfo
+
+            date, midnight = next_date, next_midnight
+
+    def localize(self, date, local_time):
+
+        """
+        combines date and time and returns a timezone aware datetime
+
+        """
+
+        tzinfo = self.tzinfos.get(date)
+        if tzinfo is None:
+            return self.tz.localize(datetime.combine(date, local_time))
+
+        return datetime.combine(date, local_time).replace(tzinfo=tzinfo)
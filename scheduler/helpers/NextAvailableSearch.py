@@ -0,0 +1,164 @@
+# *****************************************************************************
+# scheduler/helpers/NextAvailableSearch.py
+# *****************************************************************************
+
+import heapq
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.utils import timezone
+
+from scheduler.enums import Weekday
+from scheduler.helpers.ConflictIndex import MAX_SLOT_LENGTH, ConflictIndex
+from scheduler.helpers.LocalTimeTable import get_timezone
+from scheduler.helpers.Opening import Opening
+from scheduler.models import InterviewConflict, InterviewSlot, SlotOccurrence
+
+# largest number of occurrences and of calendars of one search
+MAX_NEXT_AVAILABLE = 100
+MAX_SEARCH_CALENDARS = 100
+
+# conflicts and booked spots are loaded for windows starting at this many
+# days, doubled each time the search walks past one
+WINDOW_DAYS = 7
+
+
+# *****************************************************************************
+# NextAvailableSearch
+# *****************************************************************************
+
+class NextAvailableSearch():
+
+    """
+    finds the earliest bookable occurrences of one or more calendars after a
+    time
+
+    the weekly recurrences of each slot are generated lazily and merged in
+    time order per calendar, and the calendar streams are merged again, all
+    with heapq.merge, so the search stops at the last occurrence it needs
+    instead of expanding the booking horizons. the conflicts and booked
+    spots of every calendar are loaded together for growing windows ahead of
+    the search, so the number of queries depends on neither the number of
+    calendars nor the horizons
+
+    """
+
+    def __init__(self, calendars, after=None, now=None):
+        self.calendars = list(calendars)
+        self.now = now or timezone.now()
+
+        # (start, end) of the booking horizon of each calendar
+        self.bounds = {}
+        for calendar in self.calendars:
+            min_limit_time = self.now + timedelta(hours=calendar.min_hours_notice)
+            self.bounds[calendar.pk] = (
+                max(after, min_limit_time) if after is not None else min_limit_time,
+                self.now + timedelta(hours=calendar.max_hours_out),
+            )
+
+        self._slots = None
+        self._window_end = None
+        self._window_days = WINDOW_DAYS
+        self._conflicts = None
+        self._booked = None
+
+    def recurrences(self, calendar, slot):
+
+        """
+        yields (start, calendar id, slot id, slot, end) of the occurrences of
+        the slot from the first date of the search to the end of the horizon
+
+        """
+
+        local_tz = get_timezone(calendar.timezone)
+        start, end = self.bounds[calendar.pk]
+        weekdays = {weekday.value for weekday in Weekday if getattr(slot, weekday.name)}
+        date = start.astimezone(local_tz).date()
+        last_date = end.astimezone(local_tz).date()
+
+        while date <= last_date:
+            if date.weekday() in weekdays:
+                yield (
+                    local_tz.localize(datetime.combine(date, slot.start_time)),
+                    calendar.pk,
+                    slot.pk,
+                    slot,
+                    local_tz.localize(datetime.combine(date, slot.end_time)),
+                )
+            date = date + timedelta(days=1)
+
+    def calendar_occurrences(self, calendar):
+
+        """
+        yields the occurrences of the slots of the calendar within its
+        booking horizon in time order
+
+        """
+
+        start, end = self.bounds[calendar.pk]
+        merged = heapq.merge(*(self.recurrences(calendar, slot) for slot in self._slots[calendar.pk]))
+        for occurrence in merged:
+            if occurrence[0] > end:
+                return
+            if occurrence[0] >= start:
+                yield occurrence
+
+    def load_slots(self):
+        self._slots = {calendar.pk: [] for calendar in self.calendars}
+        for slot in InterviewSlot.objects.filter(calendar_id__in=self._slots).order_by('id'):
+            self._slots[slot.calendar_id].append(slot)
+
+    def load_window(self, start):
+
+        """
+        loads the conflicts and booked spots of every calendar for the next
+        window from start, each window twice as long as the previous one
+
+        """
+
+        self._window_end = start + timedelta(days=self._window_days)
+        self._window_days *= 2
+
+        calendar_ids = [calendar.pk for calendar in self.calendars]
+        conflicts = defaultdict(list)
+        rows = InterviewConflict.objects.filter(
+            calendar_id__in=calendar_ids,
+        ).overlapping(start, self._window_end + MAX_SLOT_LENGTH).values_list('calendar', 'start_time', 'end_time')
+        for calendar_id, conflict_start, conflict_end in rows:
+            conflicts[calendar_id].append((conflict_start, conflict_end))
+
+        self._conflicts = {calendar_id: ConflictIndex(conflicts[calendar_id]) for calendar_id in calendar_ids}
+        self._booked = SlotOccurrence.objects.filter(
+            slot__calendar_id__in=calendar_ids,
+        ).booked_counts(start, self._window_end)
+
+    def occurrences(self):
+
+        """
+        yields the Openings of the bookable occurrences in time order
+
+        """
+
+        if self._slots is None:
+            self.load_slots()
+
+        merged = heapq.merge(*(self.calendar_occurrences(calendar) for calendar in self.calendars))
+        for slot_start, calendar_id, _, slot, slot_end in merged:
+            if self._window_end is None or slot_start >= self._window_end:
+                self.load_window(slot_start)
+
+            booked = self._booked.get((slot.pk, slot_start), 0)
+            if booked >= slot.max_spots or self._conflicts[calendar_id].overlaps(slot_start, slot_end):
+                continue
+
+            yield Opening.from_row((slot.pk, calendar_id, slot.max_spots), slot_start, slot_end, booked)
+
+    def first(self, count):
+
+        """
+        returns the Openings of the first count bookable occurrences
+
+        """
+
+        return list(islice(self.occurrences(), count))
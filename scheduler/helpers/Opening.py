@@ -0,0 +1,236 @@
+# *****************************************************************************
+# scheduler/helpers/Opening.py
+# *****************************************************************************
+
+from collections import OrderedDict
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import pytz
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = EPOCH.replace(tzinfo=pytz.utc)
+
+
+def to_micros(dt):
+
+    """
+    returns the microseconds from the epoch to a timezone aware datetime,
+    exact where float seconds would round
+
+    """
+
+    delta = dt - EPOCH_UTC
+    return (delta.days * 24 * 60 * 60 + delta.seconds) * 10 ** 6 + delta.microseconds
+
+
+def from_micros(epoch):
+
+    """
+    returns the UTC datetime at epoch microseconds
+
+    """
+
+    return EPOCH_UTC + timedelta(microseconds=epoch)
+
+
+@lru_cache(maxsize=None)
+def format_offset(offset):
+
+    """
+    returns the isoformat suffix of a UTC offset in seconds
+
+    """
+
+    sign = '-' if offset < 0 else '+'
+    hours, minutes = divmod(abs(offset) // 60, 60)
+    return '{}{:02d}:{:02d}'.format(sign, hours, minutes)
+
+
+def format_datetime(epoch, offset):
+
+    """
+    returns the isoformat of the local time at offset seconds from UTC of
+    the epoch microseconds, as datetime.isoformat would write it
+
+    """
+
+    local = EPOCH + timedelta(microseconds=epoch + offset * 10 ** 6)
+    return local.isoformat() + format_offset(offset)
+
+
+# *****************************************************************************
+# Opening
+# *****************************************************************************
+
+class Opening():
+
+    """
+    an available occurrence of an interview slot
+
+    a plain value object with __slots__, so the thousands of occurrences of
+    a wide window cost a few words each instead of a model instance or a
+    dict, and pickle into small cache entries. times are kept as epoch
+    microseconds with the UTC offsets of the calendar timezone
+
+    """
+
+    __slots__ = (
+        'slot_id',
+        'calendar_id',
+        'start',
+        'end',
+        'start_offset',
+        'end_offset',
+        'max_spots',
+        'remaining',
+    )
+
+    def __init__(self, slot_id, calendar_id, start, end, start_offset, end_offset, max_spots, remaining):
+        self.slot_id = slot_id
+        self.calendar_id = calendar_id
+        self.start = start
+        self.end = end
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        self.max_spots = max_spots
+        self.remaining = remaining
+
+    @classmethod
+    def from_row(cls, row, start_time, end_time, booked=0):
+
+        """
+        builds the opening of a (slot id, calendar id, max spots) row at the
+        timezone aware start_time - end_time
+
+        """
+
+        slot_id, calendar_id, max_spots = row
+
+        return cls(
+            slot_id,
+            calendar_id,
+            to_micros(start_time),
+            to_micros(end_time),
+            int(start_time.utcoffset().total_seconds()),
+            int(end_time.utcoffset().total_seconds()),
+            max_spots,
+            max(max_spots - booked, 0),
+        )
+
+    def with_remaining(self, remaining):
+
+        """
+        returns a copy of the opening with the given remaining spots
+
+        """
+
+        return Opening(
+            self.slot_id,
+            self.calendar_id,
+            self.start,
+            self.end,
+            self.start_offset,
+            self.end_offset,
+            self.max_spots,
+            max(remaining, 0),
+        )
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __eq__(self, other):
+        return isinstance(other, Opening) and self.__getstate__() == other.__getstate__()
+
+    def __repr__(self):
+        return '<Opening slot {} at {}>'.format(self.slot_id, self.start_time)
+
+    @property
+    def start_time(self):
+        return format_datetime(self.start, self.start_offset)
+
+    @property
+    def end_time(self):
+        return format_datetime(self.end, self.end_offset)
+
+    def to_data(self):
+
+        """
+        returns the primitive data InterviewSlotSerializer gives the slot of
+        this opening
+
+        """
+
+        return OrderedDict([
+            ('calendar', self.calendar_id),
+            ('end_time', self.end_time),
+            ('max_spots', self.max_spots),
+            ('slot_id', self.slot_id),
+            ('start_time', self.start_time),
+        ])
+
+
+def encode_openings(openings):
+
+    """
+    returns the JSON array of the openings, written directly from their
+    values in the key order and compact form of the DRF JSON renderer
+
+    """
+
+    return '[{}]'.format(','.join(
+        '{{"calendar":{},"end_time":"{}","max_spots":{},"slot_id":{},"start_time":"{}"}}'.format(
+            opening.calendar_id,
+            opening.end_time,
+            opening.max_spots,
+            opening.slot_id,
+            opening.start_time,
+        )
+        for opening in openings
+    ))
+
+
+# *****************************************************************************
+# OpeningList
+# *****************************************************************************
+
+class OpeningList(Sequence):
+
+    """
+    a read only list of the slot data of openings, built item by item on
+    access
+
+    AvailabilityJSONRenderer writes the openings straight to JSON instead,
+    other renderers read them through tolist like any array
+
+    """
+
+    def __init__(self, openings):
+        self.openings = list(openings)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [opening.to_data() for opening in self.openings[index]]
+        return self.openings[index].to_data()
+
+    def __len__(self):
+        return len(self.openings)
+
+    def __eq__(self, other):
+        if isinstance(other, OpeningList):
+            return self.openings == other.openings
+        return isinstance(other, (list, tuple)) and self.tolist() == list(other)
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+    def tolist(self):
+        return [opening.to_data() for opening in self.openings]
+
+    def to_json(self):
+        return encode_openings(self.openings)
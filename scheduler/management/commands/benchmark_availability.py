@@ -0,0 +1,122 @@
+# *****************************************************************************
+# scheduler/management/commands/benchmark_availability.py
+# *****************************************************************************
+
+import time
+from datetime import datetime, timedelta
+from datetime import time as slot_time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from scheduler.helpers.AvailabilityEngine import AvailabilityEngine
+from scheduler.helpers.AvailabilityMatrix import AvailabilityMatrix, np
+from scheduler.models import InterviewCalendar, InterviewConflict, InterviewSlot, SlotOccurrence
+
+
+# *****************************************************************************
+# Command
+# *****************************************************************************
+
+class Command(BaseCommand):
+
+    """
+    compares the scalar AvailabilityEngine with the NumPy AvailabilityMatrix
+    on a generated calendar, checking that both find the same slots
+
+    """
+
+    help = 'benchmark for availability computation over long windows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--slots', type=int, default=32)
+        parser.add_argument('--conflicts', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def create_calendar(self, options):
+        calendar = InterviewCalendar.objects.create(
+            description='benchmark_availability',
+            timezone='US/Eastern',
+            min_hours_notice=24,
+            max_hours_out=24 * options['days'],
+        )
+
+        InterviewSlot.objects.bulk_create(
+            InterviewSlot(
+                calendar=calendar,
+                start_time=slot_time(hour=8 + i * 15 // 60 % 10, minute=i * 15 % 60),
+                end_time=slot_time(hour=9 + i * 15 // 60 % 10, minute=i * 15 % 60),
+                monday=True, tuesday=i % 2 == 0, wednesday=True, thursday=i % 3 != 0,
+                friday=True, saturday=i % 5 == 0, sunday=False,
+                max_spots=1 + i % 3,
+            )
+            for i in range(options['slots'])
+        )
+        slots = list(calendar.slots.order_by('id'))
+
+        now = timezone.now()
+        hours = 24 * options['days']
+        InterviewConflict.objects.bulk_create(
+            InterviewConflict(
+                calendar=calendar,
+                start_time=now + timedelta(hours=i * 7919 % hours),
+                end_time=now + timedelta(hours=i * 7919 % hours, minutes=30 + i % 90),
+            )
+            for i in range(options['conflicts'])
+        )
+
+        local_tz = slots[0].local_tz
+        today = now.astimezone(local_tz).date()
+        SlotOccurrence.objects.bulk_create(
+            SlotOccurrence(
+                slot=slot,
+                start_time=local_tz.localize(datetime.combine(today + timedelta(days=days), slot.start_time)),
+                booked=days % 3,
+            )
+            for days in range(0, options['days'], 2)
+            for slot in slots[days % 4::4]
+        )
+
+        return calendar, slots
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError('NumPy is not installed')
+
+        calendar, slots = self.create_calendar(options)
+        try:
+            now = timezone.now()
+            start_date = now.date()
+            end_date = start_date + timedelta(days=options['days'] - 1)
+
+            # load once, the benchmark times the computation itself
+            loaded = AvailabilityEngine(calendar, start_date, end_date, now=now)
+            loaded.load()
+            calendar.window_slots = slots
+
+            def run(engine_class):
+                engine = engine_class(
+                    calendar, start_date, end_date, now=now,
+                    conflict_index=loaded._conflicts,
+                    booked_counts=loaded._booked,
+                )
+                return list(engine.get_slots_by_date())
+
+            expected = run(AvailabilityEngine)
+            if run(AvailabilityMatrix) != expected:
+                raise CommandError('AvailabilityMatrix differs from AvailabilityEngine')
+
+            candidates = len(slots) * options['days']
+            for label, engine_class in (('scalar', AvailabilityEngine), ('numpy', AvailabilityMatrix)):
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    run(engine_class)
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write('{:<8} {} candidates, {} available, best of {}: {:.4f}s'.format(
+                    label, candidates, sum(len(day) for _, day in expected),
+                    options['repeat'], min(timings),
+                ))
+        finally:
+            calendar.delete()
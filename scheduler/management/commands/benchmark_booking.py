@@ -0,0 +1,117 @@
+# *****************************************************************************
+# scheduler/management/commands/benchmark_booking.py
+# *****************************************************************************
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from scheduler.enums import Weekday
+from scheduler.models import Interview, InterviewCalendar, InterviewSlot
+from scheduler.serializers import InterviewSerializer
+
+
+# *****************************************************************************
+# Command
+# *****************************************************************************
+
+class Command(BaseCommand):
+
+    """
+    fires parallel bookings at a single slot and checks that it is never
+    overbooked and that p99 booking latency stays bounded
+
+    run it against PostgreSQL; sqlite serializes every write on its own
+
+    """
+
+    help = 'contention benchmark for concurrent interview booking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=300)
+        parser.add_argument('--workers', type=int, default=32)
+        parser.add_argument('--max-spots', type=int, default=10)
+        parser.add_argument('--max-p99', type=float, default=1.0,
+                            help='maximum p99 latency in seconds')
+
+    def book(self, slot, start_time):
+
+        """
+        books one interview and returns (latency, outcome)
+
+        """
+
+        started = time.perf_counter()
+        serializer = InterviewSerializer(data={
+            'slot_id': slot.pk,
+            'start_time': start_time.isoformat(),
+        })
+        try:
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            outcome = 'booked'
+        except ValidationError:
+            outcome = 'rejected'
+        except DatabaseError:
+            outcome = 'error'
+        finally:
+            connection.close()
+
+        return time.perf_counter() - started, outcome
+
+    def handle(self, *args, **options):
+        calendar = InterviewCalendar.objects.create(
+            description='benchmark_booking',
+            timezone='UTC',
+            min_hours_notice=0,
+            max_hours_out=24 * 7,
+        )
+        try:
+            start_time = (timezone.now() + timedelta(days=1)).replace(
+                minute=0, second=0, microsecond=0,
+            )
+            slot = InterviewSlot.objects.create(
+                calendar=calendar,
+                start_time=start_time.time(),
+                end_time=(start_time + timedelta(hours=1)).time(),
+                max_spots=options['max_spots'],
+                **{Weekday(start_time.weekday()).name: True}
+            )
+
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                results = list(executor.map(
+                    lambda _: self.book(slot, start_time),
+                    range(options['bookings']),
+                ))
+
+            latencies = sorted(latency for latency, _ in results)
+            accepted = sum(1 for _, outcome in results if outcome == 'booked')
+            errors = sum(1 for _, outcome in results if outcome == 'error')
+            stored = Interview.objects.filter(
+                calendar=calendar,
+                canceled=False,
+                start_time=start_time,
+            ).count()
+            p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+
+            self.stdout.write(
+                'bookings={} accepted={} errors={} stored={} max_spots={} '
+                'p50={:.4f}s p99={:.4f}s'.format(
+                    len(results), accepted, errors, stored, options['max_spots'],
+                    latencies[len(latencies) // 2], p99,
+                )
+            )
+
+            if stored > options['max_spots'] or accepted != stored:
+                raise CommandError('slot overbooked')
+            if p99 > options['max_p99']:
+                raise CommandError('p99 latency {:.4f}s exceeds {}s'.format(
+                    p99, options['max_p99'],
+                ))
+        finally:
+            calendar.delete()
@@ -0,0 +1,103 @@
+# *****************************************************************************
+# scheduler/management/commands/benchmark_rendering.py
+# *****************************************************************************
+
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from datetime import time as slot_time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from scheduler.helpers.AvailabilityEngine import AvailabilityEngine
+from scheduler.helpers.Opening import OpeningList
+from scheduler.models import InterviewCalendar, InterviewSlot
+from scheduler.renderers import AvailabilityJSONRenderer
+from scheduler.serializers import InterviewSlotSerializer
+
+
+# *****************************************************************************
+# Command
+# *****************************************************************************
+
+class Command(BaseCommand):
+
+    """
+    compares rendering the available slots of a calendar through
+    InterviewSlotSerializer and JSONRenderer with Openings written by
+    AvailabilityJSONRenderer, checking that both give the same bytes
+
+    """
+
+    help = 'benchmark for rendering calendar availability'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--slots', type=int, default=32)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        calendar = InterviewCalendar.objects.create(
+            description='benchmark_rendering',
+            timezone='US/Eastern',
+            min_hours_notice=0,
+            max_hours_out=24 * (options['days'] + 1),
+        )
+        try:
+            InterviewSlot.objects.bulk_create(
+                InterviewSlot(
+                    calendar=calendar,
+                    start_time=slot_time(hour=8 + i * 15 // 60 % 10, minute=i * 15 % 60),
+                    end_time=slot_time(hour=9 + i * 15 // 60 % 10, minute=i * 15 % 60),
+                    monday=True, tuesday=True, wednesday=True, thursday=True, friday=True,
+                    max_spots=2,
+                )
+                for i in range(options['slots'])
+            )
+
+            now = timezone.now()
+            start_date = now.date() + timedelta(days=1)
+            end_date = start_date + timedelta(days=options['days'] - 1)
+
+            engine = AvailabilityEngine(calendar, start_date, end_date, now=now)
+            slots_by_date = list(engine.get_slots_by_date())
+            openings = [
+                opening
+                for date, _ in slots_by_date
+                for opening in engine.filter_openings_within_limits(engine.get_openings_for_date(date))
+            ]
+
+            def payload(slots):
+                return OrderedDict([
+                    ('id', calendar.pk),
+                    ('description', calendar.description),
+                    ('slots', slots),
+                    ('timezone', calendar.timezone),
+                ])
+
+            def render_drf():
+                slots = []
+                for date, day_slots in slots_by_date:
+                    slots.extend(InterviewSlotSerializer(day_slots, many=True, context={'date': date}).data)
+                return JSONRenderer().render(payload(slots))
+
+            def render_openings():
+                return AvailabilityJSONRenderer().render(payload(OpeningList(openings)))
+
+            expected = render_drf()
+            if render_openings() != expected:
+                raise CommandError('AvailabilityJSONRenderer output differs from JSONRenderer')
+
+            for label, function in (('drf', render_drf), ('openings', render_openings)):
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    function()
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write('{:<9} {} slots, {} bytes, best of {}: {:.4f}s'.format(
+                    label, len(openings), len(expected), options['repeat'], min(timings),
+                ))
+        finally:
+            calendar.delete()
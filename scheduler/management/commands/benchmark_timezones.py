@@ -0,0 +1,78 @@
+# *****************************************************************************
+# scheduler/management/commands/benchmark_timezones.py
+# *****************************************************************************
+
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as slot_time
+
+import pytz
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduler.helpers.LocalTimeTable import LocalTimeTable, get_timezone
+
+
+# *****************************************************************************
+# Command
+# *****************************************************************************
+
+class Command(BaseCommand):
+
+    """
+    compares localizing slot start and end times across a window with
+    pytz.timezone(...).localize against the precomputed LocalTimeTable
+
+    """
+
+    help = 'microbenchmark for slot time localization'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timezone', default='US/Eastern')
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--slots', type=int, default=16)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        name = options['timezone']
+        start_date = date.today()
+        end_date = start_date + timedelta(days=options['days'] - 1)
+        times = [
+            slot_time(hour=8 + (i * 30) // 60 % 12, minute=(i * 30) % 60)
+            for i in range(options['slots'])
+        ]
+
+        def dates():
+            current = start_date
+            while current <= end_date:
+                yield current
+                current = current + timedelta(days=1)
+
+        def localize_each():
+            return [
+                pytz.timezone(name).localize(datetime.combine(current, local_time))
+                for current in dates()
+                for local_time in times
+            ]
+
+        def localize_table():
+            table = LocalTimeTable(get_timezone(name), start_date, end_date)
+            return [
+                table.localize(current, local_time)
+                for current in dates()
+                for local_time in times
+            ]
+
+        expected = localize_each()
+        result = localize_table()
+        if [dt.isoformat() for dt in result] != [dt.isoformat() for dt in expected]:
+            raise CommandError('LocalTimeTable differs from pytz localize')
+
+        for label, function in (('pytz localize', localize_each), ('LocalTimeTable', localize_table)):
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                function()
+                timings.append(time.perf_counter() - started)
+            self.stdout.write('{:<16} {} localizations, best of {}: {:.4f}s'.format(
+                label, len(expected), options['repeat'], min(timings),
+            ))
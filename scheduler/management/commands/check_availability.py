@@ -0,0 +1,56 @@
+# *****************************************************************************
+# scheduler/management/commands/check_availability.py
+# *****************************************************************************
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from scheduler.helpers.AvailabilityCache import AvailabilityCache
+from scheduler.models import InterviewCalendar
+
+
+# *****************************************************************************
+# Command
+# *****************************************************************************
+
+class Command(BaseCommand):
+
+    """
+    compares the cached availability of calendars with a full recompute and
+    optionally invalidates the days that differ
+
+    """
+
+    help = 'checks cached availability against a full recompute'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calendar', type=int, action='append', dest='calendars')
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--repair', action='store_true')
+
+    def handle(self, *args, **options):
+        calendars = InterviewCalendar.objects.order_by('id')
+        if options['calendars']:
+            calendars = calendars.filter(pk__in=options['calendars'])
+            missing = set(options['calendars']) - {calendar.pk for calendar in calendars}
+            if missing:
+                raise CommandError('unknown calendars: {}'.format(', '.join(map(str, sorted(missing)))))
+
+        start_date = timezone.now().date()
+        end_date = start_date + timedelta(days=options['days'])
+
+        cache = AvailabilityCache()
+        mismatched = 0
+        for calendar in calendars:
+            dates = cache.check_consistency(calendar, start_date, end_date)
+            for date in dates:
+                self.stdout.write('calendar {} differs on {}'.format(calendar.pk, date.isoformat()))
+            if dates and options['repair']:
+                cache.bump([cache.day_version_key(calendar.pk, date) for date in dates])
+            mismatched += len(dates)
+
+        self.stdout.write('{} mismatched days{}'.format(
+            mismatched, ', invalidated' if options['repair'] and mismatched else '',
+        ))
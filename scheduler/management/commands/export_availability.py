@@ -0,0 +1,73 @@
+# *****************************************************************************
+# scheduler/management/commands/export_availability.py
+# *****************************************************************************
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from scheduler.helpers.AvailabilityPool import AvailabilityPool
+from scheduler.helpers.Opening import encode_openings
+from scheduler.models import InterviewCalendar
+
+
+# *****************************************************************************
+# Command
+# *****************************************************************************
+
+class Command(BaseCommand):
+
+    """
+    writes the available slots of calendars as JSON lines, one calendar per
+    line in id order, computed by an AvailabilityPool
+
+    """
+
+    help = 'exports calendar availability, computed across worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='output file, - for stdout')
+        parser.add_argument('--start-date')
+        parser.add_argument('--end-date')
+        parser.add_argument('--calendar', type=int, action='append', dest='calendars')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='worker processes, the number of CPUs by default')
+        parser.add_argument('--chunk-size', type=int, default=50)
+
+    def get_dates(self, options):
+        today = timezone.now().date()
+        start_date = parse_date(options['start_date']) if options['start_date'] else today
+        end_date = parse_date(options['end_date']) if options['end_date'] else start_date + timedelta(days=30)
+        if start_date is None or end_date is None:
+            raise CommandError('dates must be YYYY-MM-DD')
+
+        return start_date, end_date
+
+    def handle(self, *args, **options):
+        start_date, end_date = self.get_dates(options)
+
+        calendar_ids = InterviewCalendar.objects.order_by('id').values_list('pk', flat=True)
+        if options['calendars']:
+            calendar_ids = calendar_ids.filter(pk__in=options['calendars'])
+        calendar_ids = list(calendar_ids)
+
+        pool = AvailabilityPool(workers=options['workers'], chunk_size=options['chunk_size'])
+        output = self.stdout if options['path'] == '-' else open(options['path'], 'w')
+
+        started = time.perf_counter()
+        slots = 0
+        try:
+            for calendar_id, days in pool.map(calendar_ids, start_date, end_date):
+                openings = [opening for _, day_openings in days for opening in day_openings]
+                output.write('{{"id":{},"slots":{}}}\n'.format(calendar_id, encode_openings(openings)))
+                slots += len(openings)
+        finally:
+            if output is not self.stdout:
+                output.close()
+
+        self.stderr.write('exported {} calendars, {} slots in {:.2f}s'.format(
+            len(calendar_ids), slots, time.perf_counter() - started,
+        ))
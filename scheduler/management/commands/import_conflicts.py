@@ -0,0 +1,88 @@
+# *****************************************************************************
+# scheduler/management/commands/import_conflicts.py
+# *****************************************************************************
+
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from scheduler.helpers.ConflictImporter import ConflictImporter
+from scheduler.models import InterviewCalendar, InterviewConflict
+
+
+# *****************************************************************************
+# Command
+# *****************************************************************************
+
+class Command(BaseCommand):
+
+    """
+    imports conflicts from CSV rows of calendar id, start time and end time,
+    coalescing overlapping and touching ranges of each calendar
+
+    """
+
+    help = 'imports and coalesces interview conflicts from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?',
+                            help='CSV file of calendar,start_time,end_time rows, - for stdin')
+        parser.add_argument('--compact', action='store_true',
+                            help='also coalesce the conflicts already stored')
+
+    def parse_datetime(self, value, line):
+        try:
+            parsed = parse_datetime(value.strip())
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError('line {}: invalid datetime {!r}'.format(line, value))
+
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+
+        return parsed
+
+    def read(self, rows, importer):
+        for line, row in enumerate(rows, 1):
+            if not row or (line == 1 and not row[0].strip().isdigit()):
+                # blank line or header
+                continue
+            if len(row) != 3:
+                raise CommandError('line {}: expected calendar,start_time,end_time'.format(line))
+
+            if not row[0].strip().isdigit():
+                raise CommandError('line {}: invalid calendar id {!r}'.format(line, row[0]))
+
+            importer.add(
+                int(row[0]),
+                self.parse_datetime(row[1], line),
+                self.parse_datetime(row[2], line),
+            )
+
+    def handle(self, *args, **options):
+        if options['path'] is None and not options['compact']:
+            raise CommandError('give a CSV file, - for stdin, or --compact')
+
+        importer = ConflictImporter()
+
+        if options['compact']:
+            rows = InterviewConflict.objects.values_list('calendar', 'start_time', 'end_time')
+            for calendar_id, start_time, end_time in rows.iterator():
+                importer.add(calendar_id, start_time, end_time)
+
+        if options['path'] == '-':
+            self.read(csv.reader(sys.stdin), importer)
+        elif options['path'] is not None:
+            with open(options['path'], newline='') as f:
+                self.read(csv.reader(f), importer)
+
+        try:
+            stats = importer.save()
+        except InterviewCalendar.DoesNotExist as e:
+            raise CommandError(str(e))
+
+        self.stdout.write('received {received}, created {created}, deleted {deleted} conflicts'.format(**stats))
@@ -0,0 +1,77 @@
+# *****************************************************************************
+# scheduler/management/commands/load_test.py
+# *****************************************************************************
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(timings, fraction):
+    return timings[min(int(len(timings) * fraction), len(timings) - 1)]
+
+
+# *****************************************************************************
+# Command
+# *****************************************************************************
+
+class Command(BaseCommand):
+
+    """
+    sends concurrent GET requests to a running server and reports its
+    throughput and latency percentiles, to compare deployments and settings
+    such as SCHEDULER_FETCH_CONCURRENCY
+
+    """
+
+    help = 'measures throughput and latency of an endpoint of a running server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url')
+        parser.add_argument('--clients', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def request(self, url, timeout):
+
+        """
+        returns (seconds, ok) of one request
+
+        """
+
+        started = time.perf_counter()
+        try:
+            with urlopen(url, timeout=timeout) as response:
+                response.read()
+                ok = response.status == 200
+        except (URLError, OSError):
+            ok = False
+
+        return time.perf_counter() - started, ok
+
+    def handle(self, *args, **options):
+        if options['clients'] < 1 or options['requests'] < 1:
+            raise CommandError('--clients and --requests must be positive')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['clients']) as pool:
+            results = list(pool.map(
+                lambda _: self.request(options['url'], options['timeout']),
+                range(options['requests']),
+            ))
+        elapsed = time.perf_counter() - started
+
+        timings = sorted(seconds for seconds, ok in results if ok)
+        errors = len(results) - len(timings)
+        if not timings:
+            raise CommandError('all {} requests failed'.format(errors))
+
+        self.stdout.write('{} requests, {} clients, {} errors in {:.2f}s: {:.1f} requests/s'.format(
+            len(results), options['clients'], errors, elapsed, len(timings) / elapsed,
+        ))
+        self.stdout.write('latency p50 {:.1f}ms p95 {:.1f}ms p99 {:.1f}ms max {:.1f}ms'.format(
+            *(percentile(timings, fraction) * 1000 for fraction in (0.5, 0.95, 0.99, 1))
+        ))
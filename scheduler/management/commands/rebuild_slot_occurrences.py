@@ -0,0 +1,76 @@
+# *****************************************************************************
+# scheduler/management/commands/rebuild_slot_occurrences.py
+# *****************************************************************************
+
+import pytz
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from scheduler.enums import Weekday
+from scheduler.helpers.AvailabilityCache import AvailabilityCache
+from scheduler.models import Interview, InterviewCalendar, InterviewSlot, SlotOccurrence
+
+
+# *****************************************************************************
+# Command
+# *****************************************************************************
+
+class Command(BaseCommand):
+
+    """
+    rebuilds the slot occurrence capacity counters from booked interviews
+
+    """
+
+    help = 'rebuilds slot occurrence counters from existing interviews'
+
+    def assign_slots(self):
+
+        """
+        links interviews without a slot to the calendar slot starting at the
+        same local time on that weekday, returns the number of linked rows
+
+        """
+
+        slots = {}
+        for slot in InterviewSlot.objects.order_by('id'):
+            slots.setdefault(slot.calendar_id, []).append(slot)
+
+        assigned = 0
+        interviews = Interview.objects.filter(
+            slot__isnull=True,
+            calendar__isnull=False,
+        ).select_related('calendar')
+
+        for interview in interviews.iterator():
+            local_start = interview.start_time.astimezone(
+                pytz.timezone(interview.calendar.timezone),
+            )
+            weekday = Weekday(local_start.weekday()).name
+
+            for slot in slots.get(interview.calendar_id, []):
+                if slot.start_time == local_start.time() and getattr(slot, weekday):
+                    Interview.objects.filter(pk=interview.pk).update(slot=slot)
+                    assigned += 1
+                    break
+
+        return assigned
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            assigned = self.assign_slots()
+            counts = Interview.objects.filter(slot__isnull=False).booked_counts()
+
+            SlotOccurrence.objects.all().delete()
+            SlotOccurrence.objects.bulk_create(
+                SlotOccurrence(slot_id=slot_id, start_time=start_time, booked=booked)
+                for (slot_id, start_time), booked in counts.items()
+            )
+
+            for calendar_id in InterviewCalendar.objects.values_list('pk', flat=True):
+                AvailabilityCache().invalidate_calendar(calendar_id)
+            InterviewCalendar.objects.touch()
+
+        self.stdout.write('linked {} interviews, rebuilt {} slot occurrences'.format(
+            assigned, len(counts),
+        ))
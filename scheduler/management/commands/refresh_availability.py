@@ -0,0 +1,98 @@
+# *****************************************************************************
+# scheduler/management/commands/refresh_availability.py
+# *****************************************************************************
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from scheduler.helpers.AvailabilityMaterializer import AvailabilityMaterializer
+from scheduler.models import InterviewCalendar
+
+
+# *****************************************************************************
+# Command
+# *****************************************************************************
+
+class Command(BaseCommand):
+
+    """
+    keeps the AvailableOccurrence rows of every calendar up to date
+
+    calendars are refreshed when a write moved their version, and ahead of
+    their booking horizon passing the end of their rows, by a pool of
+    threads. runs until interrupted unless --once is given
+
+    """
+
+    help = 'refreshes materialized calendar availability'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--poll', type=float, default=5,
+                            help='seconds between checks for changed calendars')
+        parser.add_argument('--interval', type=int,
+                            default=getattr(settings, 'SCHEDULER_MATERIALIZE_INTERVAL', 5 * 60),
+                            help='seconds ahead of the end of their rows calendars are refreshed')
+        parser.add_argument('--once', action='store_true')
+
+    def refresh(self, materializer, calendar):
+
+        """
+        refreshes one calendar, returns the number of rows stored or None
+        when the refresh failed
+
+        """
+
+        try:
+            return materializer.refresh(calendar)
+        except Exception as e:
+            self.stderr.write('calendar {} failed: {!r}'.format(calendar.pk, e))
+            return None
+
+    def refresh_in_thread(self, materializer, calendar):
+        try:
+            return self.refresh(materializer, calendar)
+        finally:
+            # each thread opens its own connection
+            connection.close()
+
+    def refresh_stale(self, options, pool):
+
+        """
+        refreshes the calendars needing it, returns (calendars, rows)
+
+        """
+
+        materializer = AvailabilityMaterializer()
+        calendars = [
+            calendar for calendar in InterviewCalendar.objects.order_by('id')
+            if materializer.needs_refresh(calendar, options['interval'])
+        ]
+
+        if pool is None:
+            rows = [self.refresh(materializer, calendar) for calendar in calendars]
+        else:
+            rows = list(pool.map(lambda calendar: self.refresh_in_thread(materializer, calendar), calendars))
+
+        return len(calendars), sum(count for count in rows if count is not None)
+
+    def handle(self, *args, **options):
+        pool = ThreadPoolExecutor(options['workers']) if options['workers'] > 1 else None
+        try:
+            while True:
+                started = time.perf_counter()
+                calendars, rows = self.refresh_stale(options, pool)
+                if calendars or options['once']:
+                    self.stdout.write('refreshed {} calendars, {} available occurrences in {:.2f}s'.format(
+                        calendars, rows, time.perf_counter() - started,
+                    ))
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+        finally:
+            if pool is not None:
+                pool.shutdown()
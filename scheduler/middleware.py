@@ -0,0 +1,53 @@
+# *****************************************************************************
+# scheduler/middleware.py
+# *****************************************************************************
+
+import time
+
+from django.conf import settings
+
+from scheduler.routers import get_replica_alias, set_sticky
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+# *****************************************************************************
+# ReplicaStickinessMiddleware
+# *****************************************************************************
+
+class ReplicaStickinessMiddleware():
+
+    """
+    sends the reads of a client to the primary database for
+    SCHEDULER_REPLICA_STICKINESS seconds after it wrote, so a candidate sees
+    their booking right away whichever worker serves the next request
+
+    the end of the window is kept in a cookie
+
+    """
+
+    cookie_name = 'scheduler_primary_until'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if get_replica_alias() is None:
+            return self.get_response(request)
+
+        try:
+            primary_until = float(request.COOKIES.get(self.cookie_name, 0))
+        except ValueError:
+            primary_until = 0
+
+        set_sticky(primary_until > time.time())
+        try:
+            response = self.get_response(request)
+        finally:
+            set_sticky(False)
+
+        if request.method not in SAFE_METHODS:
+            stickiness = getattr(settings, 'SCHEDULER_REPLICA_STICKINESS', 10)
+            response.set_cookie(self.cookie_name, str(time.time() + stickiness), max_age=stickiness)
+
+        return response
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+GIST_INDEX_NAME = 'scheduler_conflict_tstzrange_idx'
+
+
+def create_range_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX {} ON scheduler_interviewconflict USING gist "
+        "(tstzrange(least(start_time, end_time), greatest(start_time, end_time), '[]'))".format(
+            GIST_INDEX_NAME,
+        )
+    )
+
+
+def drop_range_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS {}'.format(GIST_INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0004_interview'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='interviewconflict',
+            index=models.Index(fields=['calendar', 'start_time', 'end_time'], name='scheduler_conflict_range_idx'),
+        ),
+        migrations.RunPython(create_range_index, drop_range_index),
+    ]
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import pytz
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+def count_booked_interviews(apps, schema_editor):
+
+    """
+    links existing interviews to the slot starting at the same local time on
+    their weekday and counts the non canceled ones, as the
+    rebuild_slot_occurrences command does
+
+    """
+
+    Interview = apps.get_model('scheduler', 'Interview')
+    InterviewSlot = apps.get_model('scheduler', 'InterviewSlot')
+    SlotOccurrence = apps.get_model('scheduler', 'SlotOccurrence')
+
+    slots = {}
+    for slot in InterviewSlot.objects.order_by('id'):
+        slots.setdefault(slot.calendar_id, []).append(slot)
+
+    interviews = Interview.objects.filter(slot__isnull=True, calendar__isnull=False).select_related('calendar')
+    for interview in interviews.iterator():
+        local_start = interview.start_time.astimezone(pytz.timezone(interview.calendar.timezone))
+        weekday = WEEKDAYS[local_start.weekday()]
+
+        for slot in slots.get(interview.calendar_id, []):
+            if slot.start_time == local_start.time() and getattr(slot, weekday):
+                Interview.objects.filter(pk=interview.pk).update(slot=slot)
+                break
+
+    rows = Interview.objects.filter(slot__isnull=False, canceled=False).order_by().values_list(
+        'slot', 'start_time',
+    ).annotate(booked=models.Count('*'))
+    SlotOccurrence.objects.bulk_create(
+        SlotOccurrence(slot_id=slot_id, start_time=start_time, booked=booked)
+        for slot_id, start_time, booked in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0006_interview_slot_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interview',
+            name='slot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='interviews', to='scheduler.InterviewSlot'),
+        ),
+        migrations.CreateModel(
+            name='SlotOccurrence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.DateTimeField()),
+                ('booked', models.PositiveIntegerField(default=0)),
+                ('slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='scheduler.InterviewSlot')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='slotoccurrence',
+            unique_together=set([('slot', 'start_time')]),
+        ),
+        migrations.RunPython(count_booked_interviews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0008_interview_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interviewcalendar',
+            name='updated',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='interviewcalendar',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0009_interviewcalendar_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interviewcalendar',
+            name='materialized_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='interviewcalendar',
+            name='materialized_version',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='AvailableOccurrence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('max_spots', models.PositiveIntegerField()),
+                ('remaining', models.PositiveIntegerField()),
+                ('calendar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='available_occurrences', to='scheduler.InterviewCalendar')),
+                ('slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='available_occurrences', to='scheduler.InterviewSlot')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='availableoccurrence',
+            index=models.Index(fields=['calendar', 'date', 'slot'], name='scheduler_avail_cal_date_idx'),
+        ),
+    ]
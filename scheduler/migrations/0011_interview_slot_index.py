@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0010_availableoccurrence'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='interview',
+            name='scheduler_interview_slot_idx',
+        ),
+        migrations.AddIndex(
+            model_name='interview',
+            index=models.Index(fields=['slot', 'canceled', 'start_time'], name='scheduler_interview_slot_idx'),
+        ),
+    ]
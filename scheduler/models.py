@@ -8,15 +8,58 @@ import pytz
 import calendar
 # import datetime
 
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
 from django.utils import timezone
+from django.utils.timezone import now
 from django.utils.html import mark_safe
 
+from scheduler.helpers.LocalTimeTable import get_timezone
+
 
 # *****************************************************************************
 # Interview
 # *****************************************************************************
 
+class InterviewQuerySet(models.QuerySet):
+    """
+    queryset of interviews with aggregate capacity counting
+
+    """
+
+    def starting_between(self, start=None, end=None):
+        """
+        returns the interviews starting within the range start - end, either
+        bound may be left open
+
+        """
+
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(start_time__gte=start)
+        if end is not None:
+            queryset = queryset.filter(start_time__lt=end)
+
+        return queryset
+
+    def booked_counts(self, start=None, end=None):
+        """
+        returns {(slot id, start time): count} of non canceled interviews
+        starting within the range start - end, in a single grouped query
+
+        """
+
+        queryset = self.filter(canceled=False).starting_between(start, end)
+
+        rows = queryset.order_by().values_list('slot', 'start_time').annotate(
+            booked=models.Count('*'),
+        )
+
+        return {
+            (slot_id, start_time): booked
+            for slot_id, start_time, booked in rows
+        }
+
+
 class Interview(models.Model):
     """
     represents a scheduled candidate interview
@@ -29,6 +72,13 @@ class Interview(models.Model):
         null=True,
         related_name='interviews',
     )
+    slot = models.ForeignKey(
+        'scheduler.InterviewSlot',
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='interviews',
+    )
     created = models.DateTimeField(auto_now_add=True)
 
     canceled = models.BooleanField(default=False)
@@ -37,6 +87,37 @@ class Interview(models.Model):
     start_time = models.DateTimeField()
     end_time = models.DateTimeField(blank=True, null=True)
 
+    objects = InterviewQuerySet.as_manager()
+
+    # set by bookings that reserved the spot of a new interview before saving
+    # it, the post_save receiver takes the spot of the others
+    spot_reserved = False
+
+    class Meta:
+        indexes = [
+            # Interview.objects.booked_counts groups by (slot, start_time)
+            models.Index(
+                fields=['slot', 'canceled', 'start_time'],
+                name='scheduler_interview_slot_idx',
+            ),
+            # the filtered and the unfiltered interview listings are both
+            # ordered by (start_time, id)
+            models.Index(
+                fields=['calendar', 'start_time', 'id'],
+                name='scheduler_interview_cal_idx',
+            ),
+            models.Index(
+                fields=['start_time', 'id'],
+                name='scheduler_interview_time_idx',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # the stored row is locked while the spots of an edit move, see
+        # signals.load_stored_spot
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
     def cancel_previous(self):
         """
         cancel any previously scheduled interviews
@@ -47,7 +128,13 @@ class Interview(models.Model):
             pk=self.pk,
         ).filter(canceled=False)
 
-        previous_interviews.update(canceled=True, canceled_at=timezone.now())
+        # saved one by one so the signal receivers hand their spots back
+        canceled_at = timezone.now()
+        with transaction.atomic():
+            for interview in previous_interviews:
+                interview.canceled = True
+                interview.canceled_at = canceled_at
+                interview.save()
 
     def __str__(self):
         return 'Interview at {}'.format(self.start_time)
@@ -57,6 +144,38 @@ class Interview(models.Model):
 # InterviewCalendar
 # *****************************************************************************
 
+class InterviewCalendarQuerySet(models.QuerySet):
+    """
+    queryset of interview calendars with availability prefetching
+
+    """
+
+    def touch(self):
+        """
+        moves the calendars to a new version, for writes to their slots,
+        conflicts and interviews
+
+        the version moves in the transaction of the write so it can never
+        be lost or lag behind it. bookings touch their calendar after the
+        conditional update of the spot counter, so concurrent bookings only
+        wait on the calendar row for the end of each other's transaction
+
+        """
+
+        return self.update(version=models.F('version') + 1, updated=timezone.now())
+
+    def prefetch_availability(self, start_date, end_date):
+        """
+        prefetches slots, their occurrences and the conflicts of the date
+        range, in a fixed number of queries for any number of calendars
+
+        """
+
+        return self.prefetch_related(
+            *InterviewCalendar.availability_prefetches(start_date, end_date)
+        )
+
+
 class InterviewCalendar(models.Model):
     """
     represents an availability calendar for interview scheduling
@@ -72,6 +191,63 @@ class InterviewCalendar(models.Model):
     min_hours_notice = models.PositiveIntegerField()
     max_hours_out = models.PositiveIntegerField()
 
+    # moved on every write to the calendar or its slots, conflicts and
+    # interviews, see InterviewCalendarQuerySet.touch
+    version = models.PositiveIntegerField(default=0, editable=False)
+    updated = models.DateTimeField(default=now, editable=False)
+
+    # version and end of the window of the AvailableOccurrence rows, see
+    # AvailabilityMaterializer
+    materialized_version = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    materialized_until = models.DateTimeField(blank=True, null=True, editable=False)
+
+    objects = InterviewCalendarQuerySet.as_manager()
+
+    @staticmethod
+    def availability_range(start_date, end_date):
+        """
+        returns the UTC range covering the date range in any calendar
+        timezone
+
+        """
+
+        # calendar timezones are at most a day away from UTC
+        start = datetime.combine(start_date - timedelta(days=1), datetime.min.time())
+        end = datetime.combine(end_date + timedelta(days=2), datetime.min.time())
+
+        return start.replace(tzinfo=pytz.utc), end.replace(tzinfo=pytz.utc)
+
+    @staticmethod
+    def availability_prefetches(start_date, end_date):
+        """
+        returns the prefetches of slots, their occurrences and the conflicts
+        needed to compute availability within the date range
+
+        """
+
+        start, end = InterviewCalendar.availability_range(start_date, end_date)
+
+        return [
+            models.Prefetch(
+                'slots',
+                queryset=InterviewSlot.objects.order_by('id'),
+                to_attr='window_slots',
+            ),
+            models.Prefetch(
+                'window_slots__occurrences',
+                queryset=SlotOccurrence.objects.filter(
+                    start_time__gte=start,
+                    start_time__lt=end,
+                ),
+                to_attr='window_occurrences',
+            ),
+            models.Prefetch(
+                'conflicts',
+                queryset=InterviewConflict.objects.overlapping(start, end),
+                to_attr='window_conflicts',
+            ),
+        ]
+
     def __str__(self):
         return '{}'.format(self.description)
 
@@ -80,6 +256,40 @@ class InterviewCalendar(models.Model):
 # InterviewConflict
 # *****************************************************************************
 
+class InterviewConflictQuerySet(models.QuerySet):
+    """
+    queryset of interview conflicts with overlap filtering done by the database
+
+    """
+
+    # matches the GiST index created by migration 0005 on PostgreSQL; the
+    # closed range over least/greatest is a superset of the exact half-open
+    # predicate, which is still applied, so every backend returns the same rows
+    RANGE_OVERLAP_SQL = (
+        "tstzrange(least(scheduler_interviewconflict.start_time, "
+        "scheduler_interviewconflict.end_time), "
+        "greatest(scheduler_interviewconflict.start_time, "
+        "scheduler_interviewconflict.end_time), '[]') "
+        "&& tstzrange(%s, %s, '[]')"
+    )
+
+    def overlapping(self, start, end):
+        """
+        returns conflicts overlapping the range start - end
+
+        """
+
+        queryset = self.filter(start_time__lt=end, end_time__gt=start)
+
+        if connections[self.db].vendor == 'postgresql':
+            queryset = queryset.extra(
+                where=[self.RANGE_OVERLAP_SQL],
+                params=[start, end],
+            )
+
+        return queryset
+
+
 class InterviewConflict(models.Model):
     """
     represents a block of time in which interviews cannot be scheduled
@@ -93,6 +303,16 @@ class InterviewConflict(models.Model):
     end_time = models.DateTimeField()
     start_time = models.DateTimeField()
 
+    objects = InterviewConflictQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['calendar', 'start_time', 'end_time'],
+                name='scheduler_conflict_range_idx',
+            ),
+        ]
+
 
 # *****************************************************************************
 # InterviewSlot
@@ -129,6 +349,167 @@ class InterviewSlot(models.Model):
         returns pytz timezone for slot
 
         """
-        return pytz.timezone(self.calendar.timezone)
+        return get_timezone(self.calendar.timezone)
+
+
+# *****************************************************************************
+# SlotOccurrence
+# *****************************************************************************
+
+class SlotOccurrenceQuerySet(models.QuerySet):
+    """
+    queryset of slot occurrences with atomic capacity counting
+
+    """
+
+    def booked_counts(self, start, end):
+        """
+        returns {(slot id, start time): booked} for occurrences starting
+        within the range start - end
+
+        """
+
+        rows = self.filter(
+            start_time__gte=start,
+            start_time__lt=end,
+        ).values_list('slot', 'start_time', 'booked')
+
+        return {
+            (slot_id, start_time): booked
+            for slot_id, start_time, booked in rows
+        }
+
+    def _take_spot(self, slot, start_time, count=1):
+        return self.filter(
+            slot=slot,
+            start_time=start_time,
+            booked__lte=slot.max_spots - count,
+        ).update(booked=models.F('booked') + count)
+
+    def reserve(self, slot, start_time):
+        """
+        books a spot of the slot occurrence with a single conditional update,
+        returns false if all spots are taken
+
+        """
+
+        if self._take_spot(slot, start_time):
+            return True
+
+        # first booking of the occurrence, or the occurrence is full
+        self.get_or_create(slot=slot, start_time=start_time)
+        return bool(self._take_spot(slot, start_time))
+
+    def reserve_many(self, slots, counts):
+        """
+        books {(slot id, start time): count} spots, taking each occurrence's
+        spots in one conditional update when they are all free and one by one
+        otherwise; returns {(slot id, start time): spots taken}
+
+        """
+
+        existing = set(self.filter(
+            slot__in=slots.values(),
+            start_time__in={start_time for _, start_time in counts},
+        ).values_list('slot', 'start_time'))
+
+        missing = [key for key in counts if key not in existing]
+        if missing:
+            try:
+                with transaction.atomic():
+                    self.bulk_create([
+                        SlotOccurrence(slot_id=slot_id, start_time=start_time)
+                        for slot_id, start_time in missing
+                    ])
+            except IntegrityError:
+                # created concurrently, create whatever is still missing
+                for slot_id, start_time in missing:
+                    self.get_or_create(slot_id=slot_id, start_time=start_time)
+
+        taken = {}
+        for (slot_id, start_time), count in counts.items():
+            slot = slots[slot_id]
+            if self._take_spot(slot, start_time, count):
+                taken[(slot_id, start_time)] = count
+                continue
+
+            taken[(slot_id, start_time)] = 0
+            while taken[(slot_id, start_time)] < count and self._take_spot(slot, start_time):
+                taken[(slot_id, start_time)] += 1
+
+        return taken
+
+    def release(self, slot_id, start_time, count=1):
+        """
+        hands count spots of the slot occurrence back
 
+        """
+
+        self.filter(
+            slot_id=slot_id,
+            start_time=start_time,
+            booked__gte=count,
+        ).update(booked=models.F('booked') - count)
+
+
+class SlotOccurrence(models.Model):
+    """
+    represents the number of interviews booked in one occurrence of a slot
+
+    """
+
+    slot = models.ForeignKey(
+        'scheduler.InterviewSlot',
+        related_name='occurrences',
+    )
+    start_time = models.DateTimeField()
+    booked = models.PositiveIntegerField(default=0)
+
+    objects = SlotOccurrenceQuerySet.as_manager()
+
+    class Meta:
+        unique_together = (
+            ('slot', 'start_time'),
+        )
+
+    def __str__(self):
+        return '{} booked at {}'.format(self.booked, self.start_time)
+
+
+# *****************************************************************************
+# AvailableOccurrence
+# *****************************************************************************
+
+class AvailableOccurrence(models.Model):
+    """
+    represents a slot occurrence with remaining spots, materialized ahead of
+    requests by the refresh_availability command
+
+    """
+
+    calendar = models.ForeignKey(
+        'scheduler.InterviewCalendar',
+        related_name='available_occurrences',
+    )
+    slot = models.ForeignKey(
+        'scheduler.InterviewSlot',
+        related_name='available_occurrences',
+    )
+
+    # local date of the calendar the occurrence falls on
+    date = models.DateField()
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    max_spots = models.PositiveIntegerField()
+    remaining = models.PositiveIntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['calendar', 'date', 'slot'],
+                name='scheduler_avail_cal_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return '{} remaining at {}'.format(self.remaining, self.start_time)
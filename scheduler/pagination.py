@@ -0,0 +1,163 @@
+# *****************************************************************************
+# scheduler/pagination.py
+# *****************************************************************************
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def keyset_filter(queryset, ordering, position):
+
+    """
+    returns the rows of queryset that come after position in ordering, a
+    tuple of ascending field names
+
+    """
+
+    condition = None
+    for i, field in enumerate(ordering):
+        term = Q(**{'{}__gt'.format(field): position[i]})
+        for previous_field, previous_value in zip(ordering[:i], position[:i]):
+            term &= Q(**{previous_field: previous_value})
+        condition = term if condition is None else condition | term
+
+    return queryset.filter(condition)
+
+
+def iterate_keyset(queryset, ordering, chunk_size):
+
+    """
+    yields the rows of queryset in ordering as lists of at most chunk_size,
+    each fetched with its own keyset query so memory stays flat
+
+    """
+
+    queryset = queryset.order_by(*ordering)
+    chunk = list(queryset[:chunk_size])
+
+    while chunk:
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+
+        position = [getattr(chunk[-1], field) for field in ordering]
+        chunk = list(keyset_filter(queryset, ordering, position)[:chunk_size])
+
+
+# *****************************************************************************
+# KeysetPagination
+# *****************************************************************************
+
+class KeysetPagination(BasePagination):
+
+    """
+    forward cursor pagination over a unique ordering
+
+    the cursor holds the ordering values of the last row of a page, so every
+    page is a single indexed range scan however deep into the table it is
+
+    """
+
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    max_page_size = 1000
+    ordering = ('id',)
+    page_size = 100
+    page_size_query_param = 'pageSize'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, row):
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in (getattr(row, field) for field in self.ordering)
+        ]
+        cursor = urlsafe_b64encode(json.dumps(values).encode('ascii'))
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor.decode('ascii'))
+
+    def decode_cursor(self, request, model):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            return None
+
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode('ascii')).decode('ascii'))
+            if len(values) != len(self.ordering):
+                raise ValueError(cursor)
+            return [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        position = self.decode_cursor(request, queryset.model)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = keyset_filter(queryset, self.ordering, position)
+
+        rows = list(queryset[:self.page_size + 1])
+        self.page = rows[:self.page_size]
+        self.has_next = len(rows) > self.page_size
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+# *****************************************************************************
+# InterviewCalendarPagination
+# *****************************************************************************
+
+class InterviewCalendarPagination(KeysetPagination):
+
+    """
+    pages calendars by id, they carry their available slots so pages are
+    kept smaller
+
+    """
+
+    ordering = ('id',)
+    page_size = 50
+
+
+# *****************************************************************************
+# InterviewPagination
+# *****************************************************************************
+
+class InterviewPagination(KeysetPagination):
+
+    """
+    pages interviews chronologically
+
+    """
+
+    ordering = ('start_time', 'id')
+    page_size = 100
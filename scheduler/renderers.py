@@ -0,0 +1,51 @@
+# *****************************************************************************
+# scheduler/renderers.py
+# *****************************************************************************
+
+import json
+
+from rest_framework.renderers import JSONRenderer
+
+from scheduler.helpers.Opening import OpeningList
+
+
+# *****************************************************************************
+# AvailabilityJSONRenderer
+# *****************************************************************************
+
+class AvailabilityJSONRenderer(JSONRenderer):
+
+    """
+    a JSONRenderer writing the available slots of calendars straight from
+    their Openings
+
+    the response is walked once, OpeningLists are written by their own
+    encoder and everything else by the JSON encoder of the parent, so the
+    bytes match JSONRenderer. indented output, as requested by the browsable
+    API, is left to the parent
+
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if data is None or self.get_indent(accepted_media_type, renderer_context) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        separator, key_separator = (',', ':') if self.compact else (', ', ': ')
+        encoder = self.encoder_class(ensure_ascii=self.ensure_ascii, separators=(separator, key_separator))
+
+        def encode(value):
+            if isinstance(value, OpeningList):
+                return value.to_json() if self.compact else encoder.encode(value.tolist())
+            if isinstance(value, dict):
+                return '{' + separator.join(
+                    encoder.encode(key if isinstance(key, str) else json.dumps(key)) + key_separator + encode(item)
+                    for key, item in value.items()
+                ) + '}'
+            if isinstance(value, (list, tuple)):
+                return '[' + separator.join(encode(item) for item in value) + ']'
+            return encoder.encode(value)
+
+        ret = encode(data)
+        ret = ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+        return bytes(ret.encode('utf-8'))
@@ -0,0 +1,87 @@
+# *****************************************************************************
+# scheduler/routers.py
+# *****************************************************************************
+
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+def get_replica_alias():
+
+    """
+    returns the alias of the read replica, None when it is not configured
+
+    """
+
+    alias = getattr(settings, 'SCHEDULER_REPLICA_DATABASE', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', 0) > 0 or getattr(_state, 'sticky', False)
+
+
+def set_sticky(sticky):
+
+    """
+    sends the reads of the current thread to the primary until unset, see
+    ReplicaStickinessMiddleware
+
+    """
+
+    _state.sticky = sticky
+
+
+@contextmanager
+def use_primary():
+
+    """
+    sends the reads of the current thread to the primary within the block,
+    for reads that writes depend on
+
+    """
+
+    _state.pinned = getattr(_state, 'pinned', 0) + 1
+    try:
+        yield
+    finally:
+        _state.pinned -= 1
+
+
+# *****************************************************************************
+# ReplicaRouter
+# *****************************************************************************
+
+class ReplicaRouter():
+
+    """
+    sends reads to the read replica and writes to the primary
+
+    reads go to the primary as well inside transactions, within use_primary
+    blocks and for clients that wrote within the stickiness window, so
+    bookings check capacity against the primary and candidates see their
+    own bookings before the replica catches up
+
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = get_replica_alias()
+        if replica is None or is_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != get_replica_alias()
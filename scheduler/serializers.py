@@ -2,15 +2,20 @@
 # scheduler/serializers.py
 # *****************************************************************************
 
-from datetime import datetime, timedelta
+from datetime import datetime
 
 import rest_framework.serializers as serializers
+from django.db import transaction
 from django.utils.dateparse import parse_date
 from django.shortcuts import get_object_or_404
 
+from scheduler.helpers.AvailabilityCache import AvailabilityCache
+from scheduler.helpers.AvailabilityMaterializer import AvailabilityMaterializer
+from scheduler.helpers.AvailabilityMaterializer import is_enabled as is_materialized
 from scheduler.helpers.InterviewScheduleHandler import InterviewScheduleHandler
+from scheduler.helpers.Opening import OpeningList
+from scheduler.routers import use_primary
 from . import models
-from .enums import Weekday
 
 
 # *****************************************************************************
@@ -79,28 +84,6 @@ class InterviewCalendarSerializer(serializers.ModelSerializer):
 
     slots = serializers.SerializerMethodField()
 
-    def _get_slots_for_date(self, calendar, date):
-
-        """
-        return available slots for particular date
-
-        """
-
-        filter_kwargs = {
-            Weekday(date.weekday()).name: True,
-        }
-
-        slots = calendar.slots.filter(**filter_kwargs)
-        slots = [slot for slot in slots if slot.is_available(date)]
-
-        serializer = InterviewSlotSerializer(
-            slots,
-            context={'date': date},
-            many=True,
-        )
-
-        return serializer.data
-
     def get_slots(self, obj):
 
         """
@@ -117,12 +100,22 @@ class InterviewCalendarSerializer(serializers.ModelSerializer):
         start = parse_date(start_date)
         end = parse_date(end_date)
 
+        # calendars refreshed by the refresh_availability command are read
+        # from their materialized rows
+        availability = AvailabilityCache()
+        if is_materialized():
+            materializer = AvailabilityMaterializer()
+            if materializer.is_fresh(obj):
+                availability = materializer
+
+        # openings give the InterviewSlotSerializer data of their slot
+        # without going through its fields for every occurrence, and are
+        # written straight to JSON by AvailabilityJSONRenderer
         available_slots = []
-        while start <= end:
-            available_slots.extend(self._get_slots_for_date(obj, start))
-            start = start + timedelta(days=1)
+        for date, openings in availability.get_openings_by_date(obj, start, end):
+            available_slots.extend(openings)
 
-        return available_slots
+        return OpeningList(available_slots)
 
     class Meta:
         model = models.InterviewCalendar
@@ -154,23 +147,30 @@ class InterviewSerializer(serializers.ModelSerializer):
 
         """
         slot_id = validated_data.pop('slot_id')
-        slot = get_object_or_404(models.InterviewSlot, pk=slot_id)
-        # check that interview time is still available
-        handler = InterviewScheduleHandler(validated_data.get('start_time'), slot)
+        start_time = validated_data.get('start_time')
+
+        # the slot and its capacity are checked against the primary
+        with use_primary(), transaction.atomic():
+            slot = get_object_or_404(models.InterviewSlot, pk=slot_id)
 
-        if not handler.is_available():
-            raise serializers.ValidationError(
-                'Interview time is no longer available',
-            )
+            # check that interview time is still available, the spot itself
+            # is taken by a conditional update that cannot overbook the slot
+            handler = InterviewScheduleHandler(start_time, slot)
 
-        #if not slot.is_available(validated_data.get('start_time')):
-        #    raise serializers.ValidationError(
-        #        'Interview time is no longer available',
-        #    )
+            if (not handler.is_available() or
+                    not models.SlotOccurrence.objects.reserve(slot, start_time)):
+                raise serializers.ValidationError(
+                    'Interview time is no longer available',
+                )
 
-        validated_data['calendar'] = slot.calendar
+            validated_data['calendar'] = slot.calendar
+            validated_data['slot'] = slot
 
-        return models.Interview.objects.create(**validated_data)
+            # the spot is taken, the post_save receiver must not take another
+            interview = models.Interview(**validated_data)
+            interview.spot_reserved = True
+            interview.save()
+            return interview
 
     class Meta():
         model = models.Interview
@@ -184,3 +184,36 @@ class InterviewSerializer(serializers.ModelSerializer):
             'slot_id',
             'start_time',
         )
+        read_only_fields = (
+            'canceled',
+            'canceled_at',
+        )
+
+
+# *****************************************************************************
+# InterviewConflictSerializer
+# *****************************************************************************
+
+class InterviewConflictSerializer(serializers.ModelSerializer):
+
+    """
+    serializes an interview conflict, the calendar is a plain id so a batch
+    of conflicts is validated without a query per conflict
+
+    """
+
+    calendar = serializers.IntegerField(source='calendar_id')
+
+    def validate(self, data):
+        if data['end_time'] < data['start_time']:
+            raise serializers.ValidationError('end_time must not be before start_time')
+        return data
+
+    class Meta:
+        model = models.InterviewConflict
+        fields = (
+            'id',
+            'calendar',
+            'end_time',
+            'start_time',
+        )
@@ -0,0 +1,135 @@
+# *****************************************************************************
+# scheduler/signals.py
+# *****************************************************************************
+
+from django.db import IntegrityError
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from scheduler.helpers.AvailabilityCache import AvailabilityCache
+from .models import Interview, InterviewCalendar, InterviewConflict, InterviewSlot, SlotOccurrence
+
+
+# *****************************************************************************
+# availability cache invalidation
+# *****************************************************************************
+
+# every receiver also moves the calendar to a new version, which the ETags
+# of the calendar endpoint are derived from
+
+@receiver(post_save, sender=InterviewCalendar)
+def invalidate_calendar(sender, instance, **kwargs):
+
+    """
+    calendar timezone changes move every slot
+
+    """
+
+    AvailabilityCache().invalidate_calendar(instance.pk)
+    InterviewCalendar.objects.filter(pk=instance.pk).touch()
+
+
+@receiver(post_save, sender=InterviewSlot)
+@receiver(post_delete, sender=InterviewSlot)
+def invalidate_slot(sender, instance, **kwargs):
+
+    """
+    slots recur on every week of the calendar
+
+    """
+
+    AvailabilityCache().invalidate_calendar(instance.calendar_id)
+    InterviewCalendar.objects.filter(pk=instance.calendar_id).touch()
+
+
+@receiver(post_save, sender=InterviewConflict)
+@receiver(post_delete, sender=InterviewConflict)
+def invalidate_conflict(sender, instance, created=False, **kwargs):
+
+    """
+    the previous range of an edited conflict is unknown, so edits invalidate
+    the whole calendar
+
+    """
+
+    if kwargs.get('signal') is post_save and not created:
+        AvailabilityCache().invalidate_calendar(instance.calendar_id)
+    else:
+        AvailabilityCache().invalidate_range(
+            instance.calendar,
+            instance.start_time,
+            instance.end_time,
+        )
+    InterviewCalendar.objects.filter(pk=instance.calendar_id).touch()
+
+
+def get_spot(canceled, slot_id, start_time):
+
+    """
+    returns the (slot id, start time) occurrence an interview holds a spot
+    of, None for canceled interviews and interviews without a slot
+
+    """
+
+    if canceled or slot_id is None:
+        return None
+    return (slot_id, start_time)
+
+
+@receiver(pre_save, sender=Interview)
+@receiver(pre_delete, sender=Interview)
+def load_stored_spot(sender, instance, raw=False, **kwargs):
+
+    """
+    remembers the spot held by the stored row of an edited or deleted
+    interview, the row stays locked until the save or delete commits so
+    concurrent cancellations hand the spot back once
+
+    """
+
+    instance.stored_spot = None
+    if instance.pk is None or raw:
+        return
+
+    rows = Interview.objects.select_for_update().filter(
+        pk=instance.pk,
+    ).values_list('canceled', 'slot', 'start_time')
+    for canceled, slot_id, start_time in rows:
+        instance.stored_spot = get_spot(canceled, slot_id, start_time)
+
+
+@receiver(post_save, sender=Interview)
+@receiver(post_delete, sender=Interview)
+def invalidate_interview(sender, instance, created=False, **kwargs):
+
+    """
+    new interviews take their spot unless the booking already reserved it,
+    see spot_reserved, cancellations and deletions hand it back and restored
+    interviews take it again. only the remaining spots of the occurrences
+    are updated in the cache
+
+    """
+
+    if instance.calendar_id is None:
+        return
+
+    stored = None if created else getattr(instance, 'stored_spot', None)
+    current = None
+    if kwargs.get('signal') is post_save:
+        current = get_spot(instance.canceled, instance.slot_id, instance.start_time)
+    if stored == current and not created:
+        return
+
+    # the booking endpoints reserve the spots of their interviews themselves
+    if stored != current and not instance.spot_reserved:
+        if stored is not None:
+            SlotOccurrence.objects.release(*stored)
+        if current is not None and not SlotOccurrence.objects.reserve(instance.slot, instance.start_time):
+            raise IntegrityError('Interview time is no longer available')
+    instance.stored_spot = current
+    instance.spot_reserved = False
+
+    occurrences = [occurrence for occurrence in (stored, current) if occurrence is not None]
+    if occurrences:
+        AvailabilityCache().update_occurrences(instance.calendar, occurrences)
+    InterviewCalendar.objects.filter(pk=instance.calendar_id).touch()
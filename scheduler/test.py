@@ -1,9 +1,46 @@
+import json
+import pickle
+import threading
+from collections import OrderedDict
+from importlib import import_module
+from io import StringIO
+from unittest.mock import patch
+
 import pytz
-from django.test import TestCase
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
 
-from scheduler.models import InterviewSlot, InterviewCalendar, InterviewConflict, Interview
+from scheduler.enums import Weekday
+from scheduler.models import (AvailableOccurrence, InterviewSlot, InterviewCalendar, InterviewConflict, Interview,
+                              SlotOccurrence)
+from .helpers.AvailabilityCache import AvailabilityCache
+from .backends.postgresql_pool.pool import ConnectionPool, PoolTimeout
+from .helpers.AvailabilityEngine import AvailabilityEngine
+from .helpers.AvailabilityFetcher import AvailabilityFetcher
+from .helpers.AvailabilityMatrix import AvailabilityMatrix
+from .helpers.AvailabilityPool import AvailabilityPool
+from .helpers.ConflictImporter import ConflictImporter, coalesce
+from .helpers.ConflictIndex import ConflictIndex
 from .helpers.InterviewScheduleHandler import InterviewScheduleHandler
-from datetime import datetime
+from .helpers.LocalTimeTable import LocalTimeTable, get_timezone
+from .helpers.NextAvailableSearch import NextAvailableSearch
+from .helpers.Opening import Opening, encode_openings
+from .middleware import ReplicaStickinessMiddleware
+from .pagination import InterviewPagination, keyset_filter
+from .renderers import AvailabilityJSONRenderer
+from .routers import use_primary
+from .serializers import InterviewSlotSerializer
+from .views import InterviewViewSet
+from datetime import date, datetime, time, timedelta
 
 class InterviewScheduleHandlerTestCase(TestCase):
     
@@ -122,4 +159,1114 @@ class InterviewScheduleHandlerTestCase(TestCase):
 
     def test_is_available_no_interview_conflict_when_no_objects_of_conflict(self):
         result = self.handler.is_available()
-        self.assertTrue(result, 'Interview conflict when slot lies between it? {}'.format(result))                   
\ No newline at end of file
+        self.assertTrue(result, 'Interview conflict when slot lies between it? {}'.format(result))                   
+
+class AvailabilityEngineTestCase(TestCase):
+
+    def setUp(self):
+        self.interview_calendar = InterviewCalendar.objects.create(description = "US NorthEast Zone",
+                                                                   timezone = "US/Eastern", min_hours_notice = 0,
+                                                                   max_hours_out = 24 * 30)
+        self.interview_slot = InterviewSlot.objects.create(calendar = self.interview_calendar,
+                                                           start_time = time(hour=14), end_time = time(hour=16),
+                                                           monday = True, tuesday = True, wednesday = True,
+                                                           thursday = True, friday = True, saturday = True,
+                                                           sunday = True, max_spots = 1)
+        self.tz = pytz.timezone(self.interview_calendar.timezone)
+        self.interview_date = timezone.now().astimezone(self.tz).date() + timedelta(days=2)
+        self.slot_start_time = self.tz.localize(datetime.combine(self.interview_date, time(hour=14)))
+
+    def get_engine(self, days=0):
+        return AvailabilityEngine(self.interview_calendar, self.interview_date,
+                                  self.interview_date + timedelta(days=days))
+
+    def test_slot_available_on_date(self):
+        result = dict(self.get_engine().get_slots_by_date())
+        self.assertEqual(result, {self.interview_date: [self.interview_slot]})
+
+    def test_slot_not_available_on_disabled_weekday(self):
+        setattr(self.interview_slot, Weekday(self.interview_date.weekday()).name, False)
+        self.interview_slot.save()
+        result = dict(self.get_engine().get_slots_by_date())
+        self.assertEqual(result, {})
+
+    def test_slot_not_available_when_conflicting(self):
+        InterviewConflict.objects.create(calendar=self.interview_calendar,
+                                         start_time=self.slot_start_time + timedelta(hours=1),
+                                         end_time=self.slot_start_time + timedelta(hours=3))
+        result = dict(self.get_engine().get_slots_by_date())
+        self.assertEqual(result, {})
+
+    def test_slot_not_available_when_full(self):
+        SlotOccurrence.objects.reserve(self.interview_slot, self.slot_start_time)
+        result = dict(self.get_engine().get_slots_by_date())
+        self.assertEqual(result, {})
+
+    def test_slot_available_when_booking_released(self):
+        SlotOccurrence.objects.reserve(self.interview_slot, self.slot_start_time)
+        SlotOccurrence.objects.release(self.interview_slot.pk, self.slot_start_time)
+        result = dict(self.get_engine().get_slots_by_date())
+        self.assertEqual(result, {self.interview_date: [self.interview_slot]})
+
+    def test_query_count_independent_of_window_length(self):
+        with self.assertNumQueries(3):
+            list(self.get_engine(days=90).get_slots_by_date())
+
+
+class AvailabilityMatrixTestCase(TestCase):
+
+    def setUp(self):
+        self.tz = get_timezone("US/Eastern")
+        self.now = self.tz.localize(datetime(2017, 1, 1, 10, 17))
+        self.interview_calendar = InterviewCalendar.objects.create(timezone = "US/Eastern", min_hours_notice = 5,
+                                                                   max_hours_out = 24 * 365)
+        self.slots = [
+            InterviewSlot.objects.create(calendar = self.interview_calendar, start_time = start_time,
+                                         end_time = end_time, monday = True, wednesday = weekend,
+                                         saturday = weekend, sunday = True, max_spots = 2)
+            for start_time, end_time, weekend in ((time(hour=9), time(hour=10), True),
+                                                  (time(hour=2, minute=30), time(hour=3, minute=30), False),
+                                                  (time(hour=15, minute=30), time(hour=17), True))
+        ]
+        for days in range(0, 365, 5):
+            start_time = self.now + timedelta(days=days, hours=days % 24)
+            InterviewConflict.objects.create(calendar=self.interview_calendar, start_time=start_time,
+                                             end_time=start_time + timedelta(hours=days % 3, minutes=1))
+        for days in range(0, 365, 3):
+            for slot in self.slots:
+                start = self.tz.localize(datetime.combine(self.now.date() + timedelta(days=days), slot.start_time))
+                SlotOccurrence.objects.create(slot=slot, start_time=start, booked=days % 3 + days % 2)
+        # DST transition days, where offsets change within the date
+        for transition_date in (date(2017, 3, 12), date(2017, 11, 5)):
+            SlotOccurrence.objects.create(slot=self.slots[0], booked=2,
+                                          start_time=self.tz.localize(datetime.combine(transition_date, time(hour=9))))
+
+    def test_matches_scalar_engine_across_dst_transitions(self):
+        start_date, end_date = date(2016, 12, 30), date(2018, 1, 2)
+        expected = list(AvailabilityEngine(self.interview_calendar, start_date, end_date,
+                                           now=self.now).get_slots_by_date())
+        result = list(AvailabilityMatrix(self.interview_calendar, start_date, end_date,
+                                         now=self.now).get_slots_by_date())
+        self.assertGreater(len(expected), 100)
+        self.assertEqual(result, expected)
+
+    def test_openings_match_scalar_engine_across_dst_transitions(self):
+        start_date, end_date = date(2016, 12, 30), date(2018, 1, 2)
+        expected = list(AvailabilityEngine(self.interview_calendar, start_date, end_date,
+                                           now=self.now).get_openings_by_date())
+        result = list(AvailabilityMatrix(self.interview_calendar, start_date, end_date,
+                                         now=self.now).get_openings_by_date())
+        self.assertGreater(len(expected), 100)
+        self.assertEqual(result, expected)
+
+    def test_slot_without_spots_is_unavailable_without_booked_counters(self):
+        SlotOccurrence.objects.all().delete()
+        InterviewSlot.objects.filter(pk=self.slots[0].pk).update(max_spots=0)
+        start_date, end_date = date(2017, 1, 2), date(2017, 1, 15)
+        expected = list(AvailabilityEngine(self.interview_calendar, start_date, end_date,
+                                           now=self.now).get_slots_by_date())
+        result = list(AvailabilityMatrix(self.interview_calendar, start_date, end_date,
+                                         now=self.now).get_slots_by_date())
+        self.assertEqual(result, expected)
+        self.assertNotIn(self.slots[0], [slot for _, slots in result for slot in slots])
+
+    def test_empty_window(self):
+        engine = AvailabilityMatrix(self.interview_calendar, date(2016, 1, 1), date(2016, 1, 2), now=self.now)
+        self.assertEqual(list(engine.get_slots_by_date()), [])
+
+
+class AvailabilityPoolTestCase(TestCase):
+
+    def setUp(self):
+        self.calendars = []
+        for zone in ("US/Eastern", "Europe/London"):
+            calendar = InterviewCalendar.objects.create(description = zone, timezone = zone,
+                                                        min_hours_notice = 0, max_hours_out = 24 * 30)
+            InterviewSlot.objects.create(calendar = calendar, start_time = time(hour=14), end_time = time(hour=16),
+                                         monday = True, tuesday = True, wednesday = True, thursday = True,
+                                         friday = True, saturday = True, sunday = True, max_spots = 1)
+            self.calendars.append(calendar)
+        self.start_date = timezone.now().date() + timedelta(days=2)
+        self.end_date = self.start_date + timedelta(days=6)
+
+    def get_openings(self, calendar):
+        engine = AvailabilityEngine(calendar, self.start_date, self.end_date)
+        return [(date, engine.filter_openings_within_limits(engine.get_openings_for_date(date)))
+                for date in engine.dates()]
+
+    def test_results_follow_calendar_order(self):
+        london, eastern = reversed(self.calendars)
+        pool = AvailabilityPool(workers=1, chunk_size=1)
+        results = list(pool.map([london.pk, 0, eastern.pk], self.start_date, self.end_date))
+        self.assertEqual(results, [(london.pk, self.get_openings(london)),
+                                   (eastern.pk, self.get_openings(eastern))])
+
+    def test_chunk_loads_in_fixed_queries(self):
+        pool = AvailabilityPool(workers=1)
+        with self.assertNumQueries(4):
+            list(pool.map([calendar.pk for calendar in self.calendars], self.start_date, self.end_date))
+
+    def test_export_writes_one_line_per_calendar(self):
+        out = StringIO()
+        call_command('export_availability', start_date=self.start_date.isoformat(),
+                     end_date=self.end_date.isoformat(), workers=1, stdout=out, stderr=StringIO())
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([line['id'] for line in lines], [calendar.pk for calendar in self.calendars])
+        self.assertEqual([len(line['slots']) for line in lines], [7, 7])
+
+
+@override_settings(SCHEDULER_FETCH_CONCURRENCY=2)
+class AvailabilityFetcherTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.calendars = []
+        for zone in ("US/Eastern", "Europe/London", "Asia/Tokyo"):
+            calendar = InterviewCalendar.objects.create(description = zone, timezone = zone,
+                                                        min_hours_notice = 0, max_hours_out = 24 * 30)
+            slot = InterviewSlot.objects.create(calendar = calendar, start_time = time(hour=14),
+                                                end_time = time(hour=16), monday = True, tuesday = True,
+                                                wednesday = True, thursday = True, friday = True,
+                                                saturday = True, sunday = True, max_spots = 1)
+            local_tz = pytz.timezone(zone)
+            start_date = timezone.now().astimezone(local_tz).date() + timedelta(days=2)
+            SlotOccurrence.objects.reserve(slot, local_tz.localize(datetime.combine(start_date, time(hour=14))))
+            InterviewConflict.objects.create(
+                calendar = calendar,
+                start_time = local_tz.localize(datetime.combine(start_date + timedelta(days=1), time(hour=13))),
+                end_time = local_tz.localize(datetime.combine(start_date + timedelta(days=1), time(hour=15))))
+            self.calendars.append(calendar)
+        self.start_date = timezone.now().date() + timedelta(days=1)
+        self.end_date = self.start_date + timedelta(days=6)
+
+    def get_slots(self, calendar):
+        return list(AvailabilityEngine(calendar, self.start_date, self.end_date).get_slots_by_date())
+
+    def test_concurrent_fetch_matches_prefetch(self):
+        fetched = list(InterviewCalendar.objects.order_by('id'))
+        AvailabilityFetcher(chunk_size=2).fetch(fetched, self.start_date, self.end_date)
+        prefetched = list(InterviewCalendar.objects.order_by('id').prefetch_availability(self.start_date,
+                                                                                          self.end_date))
+
+        with self.assertNumQueries(0):
+            results = [self.get_slots(calendar) for calendar in fetched]
+        self.assertEqual(results, [self.get_slots(calendar) for calendar in prefetched])
+        self.assertEqual([len(slots) for slots in results], [5, 5, 5])
+
+    def test_transactions_use_prefetch(self):
+        calendars = list(InterviewCalendar.objects.all())
+        with transaction.atomic(), self.assertNumQueries(3):
+            AvailabilityFetcher().fetch(calendars, self.start_date, self.end_date)
+
+
+class OpeningTestCase(TestCase):
+
+    def setUp(self):
+        self.interview_calendar = InterviewCalendar.objects.create(timezone = "US/Eastern", min_hours_notice = 0,
+                                                                   max_hours_out = 24 * 30)
+        self.interview_slot = InterviewSlot.objects.create(calendar = self.interview_calendar,
+                                                           start_time = time(hour=1, minute=30),
+                                                           end_time = time(hour=3, second=1, microsecond=5),
+                                                           sunday = True, max_spots = 3)
+        self.tz = get_timezone("US/Eastern")
+
+    def get_opening(self, interview_date, booked=0):
+        return Opening.from_row(
+            (self.interview_slot.pk, self.interview_calendar.pk, self.interview_slot.max_spots),
+            self.tz.localize(datetime.combine(interview_date, self.interview_slot.start_time)),
+            self.tz.localize(datetime.combine(interview_date, self.interview_slot.end_time)),
+            booked,
+        )
+
+    def test_data_matches_interview_slot_serializer_across_dst_transitions(self):
+        for interview_date in (date(2017, 3, 12), date(2017, 7, 2), date(2017, 11, 5)):
+            serializer = InterviewSlotSerializer(self.interview_slot, context={'date': interview_date})
+            self.assertEqual(self.get_opening(interview_date).to_data(), serializer.data)
+
+    def test_encoder_matches_drf_renderer(self):
+        openings = [self.get_opening(date(2017, 3, 12)), self.get_opening(date(2017, 3, 19), booked=2)]
+        self.assertEqual(encode_openings(openings).encode('utf-8'),
+                         JSONRenderer().render([opening.to_data() for opening in openings]))
+        self.assertEqual(encode_openings([]), '[]')
+
+    def test_pickles_compactly(self):
+        opening = self.get_opening(date(2017, 3, 19), booked=2)
+        self.assertEqual(pickle.loads(pickle.dumps(opening)), opening)
+        self.assertEqual(opening.remaining, 1)
+        self.assertLess(len(pickle.dumps(opening)), len(pickle.dumps(self.interview_slot)) / 2)
+
+    def test_engine_openings_match_open_slots(self):
+        engine = AvailabilityEngine(self.interview_calendar, date.today(), date.today() + timedelta(days=14))
+        for interview_date in engine.dates():
+            self.assertEqual(
+                [opening.slot_id for opening in engine.get_openings_for_date(interview_date)],
+                [slot.pk for slot in engine.get_open_slots_for_date(interview_date)],
+            )
+
+
+class ConflictIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.start = timezone.now().replace(microsecond=0)
+        self.index = ConflictIndex([
+            (self.start + timedelta(hours=5), self.start + timedelta(hours=6)),
+            (self.start, self.start + timedelta(hours=2)),
+            (self.start + timedelta(hours=1), self.start + timedelta(hours=3)),
+        ])
+
+    def test_overlap_with_conflict(self):
+        self.assertTrue(self.index.overlaps(self.start + timedelta(hours=2), self.start + timedelta(hours=4)))
+
+    def test_no_overlap_between_conflicts(self):
+        self.assertFalse(self.index.overlaps(self.start + timedelta(hours=3), self.start + timedelta(hours=5)))
+
+    def test_no_overlap_before_first_conflict(self):
+        self.assertFalse(self.index.overlaps(self.start - timedelta(hours=1), self.start))
+
+    def test_overlap_when_range_lies_within_conflict(self):
+        self.assertTrue(self.index.overlaps(self.start + timedelta(minutes=330), self.start + timedelta(minutes=340)))
+
+    def test_for_calendar_only_holds_conflicts_within_horizon(self):
+        interview_calendar = InterviewCalendar.objects.create(timezone = "US/Eastern", min_hours_notice = 0,
+                                                              max_hours_out = 24)
+        InterviewConflict.objects.create(calendar=interview_calendar, start_time=self.start + timedelta(hours=1),
+                                         end_time=self.start + timedelta(hours=2))
+        InterviewConflict.objects.create(calendar=interview_calendar, start_time=self.start + timedelta(days=5),
+                                         end_time=self.start + timedelta(days=6))
+        InterviewConflict.objects.create(calendar=interview_calendar, start_time=self.start - timedelta(days=6),
+                                         end_time=self.start - timedelta(days=5))
+        index = ConflictIndex.for_calendar(interview_calendar, now=self.start)
+        self.assertEqual(len(index), 1)
+
+        engine = AvailabilityEngine(interview_calendar, self.start.date() - timedelta(days=7),
+                                    self.start.date() + timedelta(days=7), now=self.start)
+        engine.load()
+        self.assertEqual(len(engine._conflicts), 1)
+
+
+class InterviewConflictQuerySetTestCase(TestCase):
+
+    def setUp(self):
+        self.start = timezone.now().replace(microsecond=0)
+        self.interview_calendar = InterviewCalendar.objects.create(timezone = "US/Eastern", min_hours_notice = 0,
+                                                                   max_hours_out = 24)
+        self.conflict = InterviewConflict.objects.create(calendar=self.interview_calendar,
+                                                         start_time=self.start + timedelta(hours=1),
+                                                         end_time=self.start + timedelta(hours=2))
+
+    def test_overlapping_returns_conflict_within_range(self):
+        conflicts = self.interview_calendar.conflicts.overlapping(self.start, self.start + timedelta(hours=3))
+        self.assertEqual(list(conflicts), [self.conflict])
+
+    def test_overlapping_excludes_touching_conflict(self):
+        conflicts = self.interview_calendar.conflicts.overlapping(self.start + timedelta(hours=2),
+                                                                  self.start + timedelta(hours=3))
+        self.assertEqual(list(conflicts), [])
+
+
+class ConflictImporterTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.interview_calendar = InterviewCalendar.objects.create(timezone = "US/Eastern", min_hours_notice = 0,
+                                                                   max_hours_out = 24 * 30)
+        self.start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+
+    def at(self, hours):
+        return self.start + timedelta(hours=hours)
+
+    def get_conflicts(self):
+        return list(self.interview_calendar.conflicts.order_by('start_time').values_list('start_time', 'end_time'))
+
+    def test_coalesce_merges_overlapping_and_touching_ranges(self):
+        self.assertEqual(
+            coalesce([(self.at(5), self.at(6)), (self.at(0), self.at(2)), (self.at(2), self.at(3)),
+                      (self.at(1), self.at(1.5)), (self.at(8), self.at(7))]),
+            [(self.at(0), self.at(3)), (self.at(5), self.at(6)), (self.at(7), self.at(8))],
+        )
+
+    def test_import_merges_with_stored_conflicts(self):
+        InterviewConflict.objects.create(calendar=self.interview_calendar, start_time=self.at(3), end_time=self.at(4))
+        InterviewConflict.objects.create(calendar=self.interview_calendar, start_time=self.at(4), end_time=self.at(5))
+        InterviewConflict.objects.create(calendar=self.interview_calendar, start_time=self.at(9), end_time=self.at(10))
+        importer = ConflictImporter()
+        importer.add(self.interview_calendar.pk, self.at(0), self.at(2))
+        importer.add(self.interview_calendar.pk, self.at(1), self.at(3))
+        self.assertEqual(importer.save(), {'received': 2, 'created': 1, 'deleted': 2})
+        self.assertEqual(self.get_conflicts(), [(self.at(0), self.at(5)), (self.at(9), self.at(10))])
+
+    def test_import_invalidates_cached_days(self):
+        slot_start = get_timezone("US/Eastern").localize(
+            datetime.combine(self.start.astimezone(get_timezone("US/Eastern")).date() + timedelta(days=1), time(hour=14)),
+        )
+        InterviewSlot.objects.create(calendar=self.interview_calendar, start_time=time(hour=14),
+                                     end_time=time(hour=15), monday=True, tuesday=True, wednesday=True,
+                                     thursday=True, friday=True, saturday=True, sunday=True, max_spots=1)
+        params = {'startDate': slot_start.date().isoformat(), 'endDate': slot_start.date().isoformat()}
+        url = '/calendars/{}/'.format(self.interview_calendar.pk)
+        self.assertEqual(len(self.client.get(url, params).data['slots']), 1)
+        importer = ConflictImporter()
+        importer.add(self.interview_calendar.pk, slot_start, slot_start + timedelta(minutes=30))
+        importer.save()
+        self.assertEqual(self.client.get(url, params).data['slots'], [])
+
+    def test_import_endpoint(self):
+        response = self.client.post('/conflicts/import/', [
+            {'calendar': self.interview_calendar.pk, 'start_time': self.at(0).isoformat(),
+             'end_time': self.at(1).isoformat()},
+            {'calendar': self.interview_calendar.pk, 'start_time': self.at(1).isoformat(),
+             'end_time': self.at(2).isoformat()},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'received': 2, 'created': 1, 'deleted': 0})
+        self.assertEqual(self.get_conflicts(), [(self.at(0), self.at(2))])
+
+    def test_import_endpoint_rejects_unknown_calendars_and_inverted_ranges(self):
+        for calendar, start, end in ((self.interview_calendar.pk + 1, 0, 1), (self.interview_calendar.pk, 1, 0)):
+            response = self.client.post('/conflicts/import/', [
+                {'calendar': calendar, 'start_time': self.at(start).isoformat(), 'end_time': self.at(end).isoformat()},
+            ], format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get_conflicts(), [])
+
+    def test_import_command_compacts_stored_conflicts(self):
+        for hours in (0, 1, 1, 2):
+            InterviewConflict.objects.create(calendar=self.interview_calendar, start_time=self.at(hours),
+                                             end_time=self.at(hours + 1))
+        out = StringIO()
+        call_command('import_conflicts', compact=True, stdout=out)
+        self.assertEqual(self.get_conflicts(), [(self.at(0), self.at(3))])
+        self.assertIn('created 1, deleted 4', out.getvalue())
+
+
+class InterviewQuerySetTestCase(TestCase):
+
+    def setUp(self):
+        self.start = timezone.now().replace(microsecond=0)
+        self.interview_calendar = InterviewCalendar.objects.create(timezone = "US/Eastern", min_hours_notice = 0,
+                                                                   max_hours_out = 24)
+        self.interview_slot = InterviewSlot.objects.create(calendar = self.interview_calendar,
+                                                           start_time = time(hour=14), end_time = time(hour=16),
+                                                           max_spots = 2)
+        for canceled in (False, False, True):
+            Interview.objects.create(calendar=self.interview_calendar, slot=self.interview_slot,
+                                     start_time=self.start, canceled=canceled)
+        Interview.objects.create(calendar=self.interview_calendar, slot=self.interview_slot,
+                                 start_time=self.start + timedelta(hours=1))
+        Interview.objects.create(calendar=self.interview_calendar, slot=self.interview_slot,
+                                 start_time=self.start + timedelta(days=2))
+
+    def test_booked_counts_groups_non_canceled_interviews_in_range(self):
+        with self.assertNumQueries(1):
+            counts = Interview.objects.booked_counts(self.start, self.start + timedelta(days=1))
+        self.assertEqual(counts, {
+            (self.interview_slot.pk, self.start): 2,
+            (self.interview_slot.pk, self.start + timedelta(hours=1)): 1,
+        })
+
+    def test_handler_rejects_slot_with_all_spots_booked(self):
+        counts = Interview.objects.booked_counts(self.start, self.start + timedelta(days=1))
+        handler = InterviewScheduleHandler(self.start, self.interview_slot, booked_counts=counts)
+        self.assertFalse(handler.check_no_of_interviews_scheduled_in_given_slot())
+        handler = InterviewScheduleHandler(self.start + timedelta(hours=1), self.interview_slot, booked_counts=counts)
+        self.assertTrue(handler.check_no_of_interviews_scheduled_in_given_slot())
+
+    def test_rebuild_slot_occurrences_counts_booked_interviews(self):
+        call_command('rebuild_slot_occurrences', stdout=StringIO())
+        counts = SlotOccurrence.objects.booked_counts(self.start, self.start + timedelta(days=3))
+        self.assertEqual(counts, Interview.objects.booked_counts())
+
+    def test_slot_occurrence_migration_counts_booked_interviews(self):
+        SlotOccurrence.objects.all().delete()
+        migration = import_module('scheduler.migrations.0007_slotoccurrence')
+        migration.count_booked_interviews(apps, None)
+        counts = SlotOccurrence.objects.booked_counts(self.start, self.start + timedelta(days=3))
+        self.assertEqual(counts, Interview.objects.booked_counts())
+
+
+class SlotOccurrenceQuerySetTestCase(TestCase):
+
+    def setUp(self):
+        self.start = timezone.now().replace(microsecond=0)
+        interview_calendar = InterviewCalendar.objects.create(timezone = "US/Eastern", min_hours_notice = 0,
+                                                              max_hours_out = 24)
+        self.interview_slot = InterviewSlot.objects.create(calendar = interview_calendar, start_time = time(hour=14),
+                                                           end_time = time(hour=16), max_spots = 2)
+
+    def test_reserve_until_all_spots_are_booked(self):
+        results = [SlotOccurrence.objects.reserve(self.interview_slot, self.start) for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(SlotOccurrence.objects.get().booked, 2)
+
+    def test_reserve_many_takes_what_is_left(self):
+        SlotOccurrence.objects.reserve(self.interview_slot, self.start)
+        taken = SlotOccurrence.objects.reserve_many({self.interview_slot.pk: self.interview_slot}, {
+            (self.interview_slot.pk, self.start): 5,
+            (self.interview_slot.pk, self.start + timedelta(days=7)): 2,
+        })
+        self.assertEqual(taken, {
+            (self.interview_slot.pk, self.start): self.interview_slot.max_spots - 1,
+            (self.interview_slot.pk, self.start + timedelta(days=7)): 2,
+        })
+
+    def test_release_hands_spot_back(self):
+        SlotOccurrence.objects.reserve(self.interview_slot, self.start)
+        SlotOccurrence.objects.reserve(self.interview_slot, self.start)
+        SlotOccurrence.objects.release(self.interview_slot.pk, self.start)
+        self.assertTrue(SlotOccurrence.objects.reserve(self.interview_slot, self.start))
+
+
+class InterviewViewSetTestCase(APITestCase):
+
+    def setUp(self):
+        self.interview_calendar = InterviewCalendar.objects.create(description = "US NorthEast Zone",
+                                                                   timezone = "US/Eastern", min_hours_notice = 0,
+                                                                   max_hours_out = 24 * 30)
+        self.interview_slot = InterviewSlot.objects.create(calendar = self.interview_calendar,
+                                                           start_time = time(hour=14), end_time = time(hour=16),
+                                                           monday = True, tuesday = True, wednesday = True,
+                                                           thursday = True, friday = True, saturday = True,
+                                                           sunday = True, max_spots = 1)
+        tz = pytz.timezone(self.interview_calendar.timezone)
+        interview_date = timezone.now().astimezone(tz).date() + timedelta(days=2)
+        self.slot_start_time = tz.localize(datetime.combine(interview_date, time(hour=14)))
+
+    def book(self):
+        return self.client.post('/interviews/', {
+            'slot_id': self.interview_slot.pk,
+            'start_time': self.slot_start_time.isoformat(),
+        }, format='json')
+
+    def test_booking_creates_interview(self):
+        response = self.book()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Interview.objects.get().calendar, self.interview_calendar)
+        self.assertEqual(SlotOccurrence.objects.get().booked, 1)
+
+    def test_booking_rejected_when_slot_is_full(self):
+        self.book()
+        response = self.book()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Interview.objects.count(), 1)
+
+    def test_booking_updates_calendar_after_taking_spot(self):
+        version = InterviewCalendar.objects.get(pk=self.interview_calendar.pk).version
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.book().status_code, 201)
+        updates = [query['sql'].split()[1] for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE')]
+        self.assertEqual(updates[-2:], ['"scheduler_slotoccurrence"', '"scheduler_interviewcalendar"'])
+
+        # the version moved with the booking, no commit callback needed
+        self.assertEqual(InterviewCalendar.objects.get(pk=self.interview_calendar.pk).version, version + 1)
+
+    def test_canceled_interview_hands_spot_back(self):
+        self.book()
+        interview = Interview.objects.get()
+        interview.canceled = True
+        interview.save()
+        self.assertEqual(SlotOccurrence.objects.get().booked, 0)
+        self.assertEqual(self.book().status_code, 201)
+
+        # restoring the interview needs the spot taken by the new booking
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            interview.canceled = False
+            interview.save()
+        self.assertTrue(Interview.objects.get(pk=interview.pk).canceled)
+
+    def test_restored_interview_takes_spot_again(self):
+        self.book()
+        interview = Interview.objects.get()
+        interview.canceled = True
+        interview.save()
+        interview.canceled = False
+        interview.save()
+        self.assertEqual(SlotOccurrence.objects.get().booked, 1)
+
+    def test_interviews_created_directly_take_their_spot(self):
+        self.book()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Interview.objects.create(calendar=self.interview_calendar, slot=self.interview_slot,
+                                     start_time=self.slot_start_time)
+
+        # a spot taken outside the API is handed back on cancellation
+        Interview.objects.get().delete()
+        interview = Interview.objects.create(calendar=self.interview_calendar, slot=self.interview_slot,
+                                             start_time=self.slot_start_time)
+        self.assertEqual(self.book().status_code, 400)
+        interview.canceled = True
+        interview.save()
+        self.assertEqual(self.book().status_code, 201)
+        self.assertEqual(SlotOccurrence.objects.get().booked, 1)
+        self.assertEqual(Interview.objects.filter(canceled=False).count(), 1)
+
+    def test_booking_cannot_set_canceled(self):
+        response = self.client.post('/interviews/', {
+            'slot_id': self.interview_slot.pk,
+            'start_time': self.slot_start_time.isoformat(),
+            'canceled': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Interview.objects.get().canceled)
+        self.assertEqual(SlotOccurrence.objects.get().booked, 1)
+
+    def test_deleted_interview_hands_spot_back(self):
+        self.book()
+        Interview.objects.get().delete()
+        self.assertEqual(SlotOccurrence.objects.get().booked, 0)
+        self.assertEqual(self.book().status_code, 201)
+
+    def test_bulk_booking_counts_batch_against_capacity(self):
+        next_day = self.slot_start_time + timedelta(days=1)
+        response = self.client.post('/interviews/bulk/', [
+            {'slot_id': self.interview_slot.pk, 'start_time': self.slot_start_time.isoformat()},
+            {'slot_id': self.interview_slot.pk, 'start_time': self.slot_start_time.isoformat()},
+            {'slot_id': self.interview_slot.pk, 'start_time': next_day.isoformat()},
+            {'slot_id': self.interview_slot.pk + 100, 'start_time': next_day.isoformat()},
+            {'slot_id': self.interview_slot.pk},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data],
+                         ['booked', 'rejected', 'booked', 'rejected', 'rejected'])
+        self.assertIn('start_time', response.data[4]['errors'])
+        self.assertEqual(Interview.objects.filter(slot=self.interview_slot).count(), 2)
+        self.assertEqual(sorted(SlotOccurrence.objects.values_list('booked', flat=True)), [1, 1])
+
+    def test_bulk_booking_respects_existing_bookings_and_conflicts(self):
+        next_day = self.slot_start_time + timedelta(days=1)
+        self.book()
+        InterviewConflict.objects.create(calendar=self.interview_calendar, start_time=next_day,
+                                         end_time=next_day + timedelta(minutes=30))
+        response = self.client.post('/interviews/bulk/', [
+            {'slot_id': self.interview_slot.pk, 'start_time': self.slot_start_time.isoformat()},
+            {'slot_id': self.interview_slot.pk, 'start_time': next_day.isoformat()},
+        ], format='json')
+        self.assertEqual([result['status'] for result in response.data], ['rejected', 'rejected'])
+        self.assertEqual(Interview.objects.count(), 1)
+
+    def test_bulk_booking_requires_a_list(self):
+        response = self.client.post('/interviews/bulk/', {'slot_id': self.interview_slot.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def create_interviews(self, count):
+        for i in range(count):
+            Interview.objects.create(calendar=self.interview_calendar,
+                                     start_time=self.slot_start_time + timedelta(hours=i % 3))
+
+    def test_cursor_pages_follow_start_time_then_id(self):
+        self.create_interviews(7)
+        expected = list(Interview.objects.order_by('start_time', 'id').values_list('id', flat=True))
+        ids = []
+        url = '/interviews/?pageSize=3'
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            ids.extend(interview['id'] for interview in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(ids, expected)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/interviews/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_stream_returns_every_interview_in_chunks(self):
+        self.create_interviews(7)
+        expected = list(Interview.objects.order_by('start_time', 'id').values_list('id', flat=True))
+        with patch.object(InterviewViewSet, 'stream_chunk_size', 3), self.assertNumQueries(3):
+            response = self.client.get('/interviews/', {'stream': 'true'})
+            content = b''.join(response.streaming_content)
+        self.assertEqual([interview['id'] for interview in json.loads(content.decode('utf-8'))], expected)
+
+    def test_interviews_filtered_by_calendar_range_and_canceled(self):
+        other_calendar = InterviewCalendar.objects.create(timezone="US/Eastern", min_hours_notice=0,
+                                                          max_hours_out=24 * 30)
+        week_start = self.slot_start_time
+        expected = Interview.objects.create(calendar=self.interview_calendar, start_time=week_start)
+        Interview.objects.create(calendar=self.interview_calendar, start_time=week_start, canceled=True)
+        Interview.objects.create(calendar=self.interview_calendar, start_time=week_start + timedelta(days=7))
+        Interview.objects.create(calendar=other_calendar, start_time=week_start)
+        response = self.client.get('/interviews/', {
+            'calendar': self.interview_calendar.pk,
+            'start': week_start.isoformat(),
+            'end': (week_start + timedelta(days=7)).isoformat(),
+            'canceled': 'false',
+        })
+        self.assertEqual([interview['id'] for interview in response.data['results']], [expected.pk])
+
+    def test_invalid_filters_are_rejected(self):
+        for params in ({'calendar': 'x'}, {'start': 'tomorrow'}, {'canceled': 'maybe'}):
+            self.assertEqual(self.client.get('/interviews/', params).status_code, 400)
+
+    def test_calendar_week_is_a_single_index_range_scan(self):
+        week_start = self.slot_start_time
+        queryset = keyset_filter(
+            Interview.objects.filter(calendar=self.interview_calendar).starting_between(
+                week_start, week_start + timedelta(days=7),
+            ).order_by('start_time', 'id'),
+            InterviewPagination.ordering,
+            [week_start, 1],
+        )[:100]
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql, params)
+            else:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(str(column) for row in cursor.fetchall() for column in row)
+        self.assertIn('scheduler_interview_cal_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_stream_of_empty_table_is_empty_array(self):
+        response = self.client.get('/interviews/', {'stream': 'true'})
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+
+class InterviewCalendarViewSetTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.interview_calendar = InterviewCalendar.objects.create(description = "US NorthEast Zone",
+                                                                   timezone = "US/Eastern", min_hours_notice = 0,
+                                                                   max_hours_out = 24 * 30)
+        self.interview_slot = InterviewSlot.objects.create(calendar = self.interview_calendar,
+                                                           start_time = time(hour=14), end_time = time(hour=16),
+                                                           monday = True, tuesday = True, wednesday = True,
+                                                           thursday = True, friday = True, saturday = True,
+                                                           sunday = True, max_spots = 1)
+        self.tz = pytz.timezone(self.interview_calendar.timezone)
+        self.interview_date = timezone.now().astimezone(self.tz).date() + timedelta(days=2)
+
+    def get_slot_start_time(self, days=0):
+        interview_date = self.interview_date + timedelta(days=days)
+        return self.tz.localize(datetime.combine(interview_date, time(hour=14)))
+
+    def get_calendar(self, days=0):
+        return self.client.get('/calendars/{}/'.format(self.interview_calendar.pk), {
+            'startDate': self.interview_date.isoformat(),
+            'endDate': (self.interview_date + timedelta(days=days)).isoformat(),
+        })
+
+    def test_calendar_lists_available_slots(self):
+        response = self.get_calendar(days=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['slots'], [
+            {
+                'calendar': self.interview_calendar.pk,
+                'end_time': self.get_slot_start_time(days=days).replace(hour=16).isoformat(),
+                'max_spots': 1,
+                'slot_id': self.interview_slot.pk,
+                'start_time': self.get_slot_start_time(days=days).isoformat(),
+            }
+            for days in (0, 1)
+        ])
+
+    def test_cached_days_are_not_recomputed(self):
+        self.get_calendar(days=6)
+        with self.assertNumQueries(1):
+            self.get_calendar(days=6)
+
+    def book(self, days=0):
+        Interview.objects.create(calendar=self.interview_calendar, slot=self.interview_slot,
+                                 start_time=self.get_slot_start_time(days=days))
+
+    @patch('django.db.transaction.on_commit', lambda func, using=None: func())
+    def test_booking_updates_cached_occurrence(self):
+        self.get_calendar(days=6)
+        self.book(days=3)
+        with self.assertNumQueries(1):
+            response = self.get_calendar(days=6)
+        start_times = [slot['start_time'] for slot in response.data['slots']]
+        self.assertEqual(len(start_times), 6)
+        self.assertNotIn(self.get_slot_start_time(days=3).isoformat(), start_times)
+
+    @patch('django.db.transaction.on_commit', lambda func, using=None: func())
+    def test_cancellation_restores_cached_occurrence(self):
+        self.get_calendar(days=6)
+        self.book(days=3)
+        interview = Interview.objects.get()
+        interview.canceled = True
+        interview.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.get_calendar(days=6).data['slots']), 7)
+
+    @patch('django.db.transaction.on_commit', lambda func, using=None: func())
+    def test_deletion_restores_cached_occurrence(self):
+        self.get_calendar(days=6)
+        self.book(days=3)
+        Interview.objects.get().delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.get_calendar(days=6).data['slots']), 7)
+
+    @patch('django.db.transaction.on_commit', lambda func, using=None: func())
+    def test_consistency_check_finds_stale_days(self):
+        self.get_calendar(days=6)
+        self.book(days=3)
+        end_date = self.interview_date + timedelta(days=6)
+        availability = AvailabilityCache()
+        self.assertEqual(availability.check_consistency(self.interview_calendar, self.interview_date, end_date), [])
+
+        SlotOccurrence.objects.filter(slot=self.interview_slot).update(booked=0)
+        self.assertEqual(availability.check_consistency(self.interview_calendar, self.interview_date, end_date),
+                         [self.interview_date + timedelta(days=3)])
+
+        out = StringIO()
+        call_command('check_availability', calendars=[self.interview_calendar.pk], repair=True, stdout=out)
+        self.assertIn('1 mismatched days, invalidated', out.getvalue())
+        self.assertEqual(len(self.get_calendar(days=6).data['slots']), 7)
+        self.assertEqual(availability.check_consistency(self.interview_calendar, self.interview_date, end_date), [])
+
+    @override_settings(SCHEDULER_MATERIALIZED_AVAILABILITY=True)
+    def test_materialized_calendar_is_read_from_rows(self):
+        expected = self.get_calendar(days=6).content
+        cache.clear()
+
+        out = StringIO()
+        call_command('refresh_availability', once=True, workers=1, stdout=out)
+        rows = AvailableOccurrence.objects.filter(calendar=self.interview_calendar)
+        self.assertIn('refreshed 1 calendars, {} available occurrences'.format(rows.count()), out.getvalue())
+        materialized = rows.count()
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get_calendar(days=6).content, expected)
+
+        call_command('refresh_availability', once=True, workers=1, stdout=out)
+        self.assertIn('refreshed 0 calendars', out.getvalue())
+
+        # bookings move the calendar version, it is computed until refreshed
+        self.book(days=3)
+        self.assertEqual(len(self.get_calendar(days=6).data['slots']), 6)
+        call_command('refresh_availability', once=True, workers=1, stdout=out)
+        self.assertEqual(rows.count(), materialized - 1)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.get_calendar(days=6).data['slots']), 6)
+
+    def get_next_available(self, **params):
+        return self.client.get('/calendars/{}/next-available/'.format(self.interview_calendar.pk), params)
+
+    def test_next_available_matches_listing(self):
+        self.book()
+        InterviewConflict.objects.create(calendar=self.interview_calendar, start_time=self.get_slot_start_time(days=1),
+                                         end_time=self.get_slot_start_time(days=1) + timedelta(hours=1))
+        after = self.tz.localize(datetime.combine(self.interview_date, time.min))
+        response = self.get_next_available(after=after.isoformat(), count=3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['slots'], self.get_calendar(days=6).data['slots'][:3])
+        self.assertEqual([slot['start_time'] for slot in response.data['slots']],
+                         [self.get_slot_start_time(days=days).isoformat() for days in (2, 3, 4)])
+
+    def test_next_available_only_loads_the_first_window(self):
+        with self.assertNumQueries(4):
+            response = self.get_next_available(after=self.get_slot_start_time().isoformat())
+        self.assertEqual([slot['start_time'] for slot in response.data['slots']],
+                         [self.get_slot_start_time().isoformat()])
+
+    def test_next_available_walks_past_loaded_windows(self):
+        search = NextAvailableSearch([self.interview_calendar])
+        openings = search.first(100)
+        listed = AvailabilityCache().get_openings_by_date(
+            self.interview_calendar, search.now.date() - timedelta(days=1), search.now.date() + timedelta(days=31),
+            now=search.now)
+        self.assertEqual(openings, [opening for _, day in listed for opening in day])
+        self.assertGreater(len(openings), 28)
+
+    def create_panel(self):
+        calendars = [self.interview_calendar]
+        for zone, hour in (("Europe/London", 9), ("Asia/Tokyo", 20)):
+            calendar = InterviewCalendar.objects.create(description = zone, timezone = zone,
+                                                        min_hours_notice = 0, max_hours_out = 24 * 30)
+            InterviewSlot.objects.create(calendar = calendar, start_time = time(hour=hour),
+                                         end_time = time(hour=hour + 1), monday = True, tuesday = True,
+                                         wednesday = True, thursday = True, friday = True, saturday = True,
+                                         sunday = True, max_spots = 1)
+            calendars.append(calendar)
+        return calendars
+
+    def test_earliest_available_merges_calendars(self):
+        calendars = self.create_panel()
+        self.book()
+        after = self.get_slot_start_time().isoformat()
+        with self.assertNumQueries(4):
+            response = self.client.get('/calendars/earliest-available/', {
+                'calendars': ','.join(str(calendar.pk) for calendar in calendars), 'after': after, 'count': 6})
+        self.assertEqual(response.status_code, 200)
+
+        expected = []
+        for calendar in calendars:
+            expected.extend(self.client.get('/calendars/{}/next-available/'.format(calendar.pk), {
+                'after': after, 'count': 6}).data['slots'])
+        expected.sort(key=lambda slot: parse_datetime(slot['start_time']))
+        self.assertEqual(response.data['slots'], expected[:6])
+        self.assertEqual({slot['calendar'] for slot in response.data['slots']},
+                         {calendar.pk for calendar in calendars})
+
+    def test_earliest_available_rejects_unknown_calendars(self):
+        for calendars in ('', '{},0'.format(self.interview_calendar.pk), 'a'):
+            response = self.client.get('/calendars/earliest-available/', {'calendars': calendars})
+            self.assertEqual(response.status_code, 400)
+
+    def test_next_available_rejects_invalid_count(self):
+        for count in ('0', '101', 'one'):
+            self.assertEqual(self.get_next_available(count=count).status_code, 400)
+
+    def test_new_conflict_invalidates_cached_day(self):
+        self.get_calendar()
+        InterviewConflict.objects.create(calendar=self.interview_calendar, start_time=self.get_slot_start_time(),
+                                         end_time=self.get_slot_start_time() + timedelta(hours=1))
+        self.assertEqual(self.get_calendar().data['slots'], [])
+
+    def test_unchanged_calendar_is_not_modified(self):
+        etag = self.get_calendar(days=6)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/calendars/{}/'.format(self.interview_calendar.pk), {
+                'startDate': self.interview_date.isoformat(),
+                'endDate': (self.interview_date + timedelta(days=6)).isoformat(),
+            }, HTTP_IF_NONE_MATCH='W/"other", {}'.format(etag))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertNotEqual(self.get_calendar(days=5)['ETag'], etag)
+
+    def test_child_writes_change_etag(self):
+        etags = [self.get_calendar()['ETag']]
+        for write in (
+            lambda: self.client.post('/interviews/', {'slot_id': self.interview_slot.pk,
+                                                      'start_time': self.get_slot_start_time().isoformat()},
+                                     format='json'),
+            lambda: InterviewConflict.objects.create(calendar=self.interview_calendar,
+                                                     start_time=self.get_slot_start_time(days=1),
+                                                     end_time=self.get_slot_start_time(days=1)),
+            lambda: self.client.post('/conflicts/import/', [{
+                'calendar': self.interview_calendar.pk,
+                'start_time': self.get_slot_start_time(days=1).isoformat(),
+                'end_time': self.get_slot_start_time(days=2).isoformat()}], format='json'),
+            lambda: InterviewSlot.objects.filter(pk=self.interview_slot.pk).get().save(),
+        ):
+            write()
+            etags.append(self.get_calendar()['ETag'])
+        self.assertEqual(len(set(etags)), len(etags))
+
+    def test_etag_changes_with_time(self):
+        etag = self.get_calendar()['ETag']
+        later = timezone.now() + timedelta(minutes=5)
+        with patch('scheduler.views.timezone.now', return_value=later):
+            self.assertNotEqual(self.get_calendar()['ETag'], etag)
+
+    def test_calendar_list_query_count_independent_of_calendar_count(self):
+        for calendar_count in (3, 10):
+            cache.clear()
+            while InterviewCalendar.objects.count() < calendar_count:
+                interview_calendar = InterviewCalendar.objects.create(timezone = "Europe/London",
+                                                                      min_hours_notice = 0, max_hours_out = 24 * 30)
+                interview_slot = InterviewSlot.objects.create(calendar = interview_calendar, start_time = time(hour=9),
+                                                              end_time = time(hour=10), monday = True, friday = True,
+                                                              max_spots = 2)
+                InterviewConflict.objects.create(calendar=interview_calendar, start_time=self.get_slot_start_time(),
+                                                 end_time=self.get_slot_start_time(days=1))
+                SlotOccurrence.objects.reserve(interview_slot, self.get_slot_start_time(days=2))
+            with self.assertNumQueries(4):
+                response = self.client.get('/calendars/', {
+                    'startDate': self.interview_date.isoformat(),
+                    'endDate': (self.interview_date + timedelta(days=14)).isoformat(),
+                })
+            self.assertEqual(len(response.data['results']), calendar_count)
+
+
+class AvailabilityJSONRendererTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.start_date = timezone.now().date() + timedelta(days=2)
+        for description, tz in (('Z\u00fcrich \u2028 "office"', 'Europe/Zurich'), ('Kolkata', 'Asia/Kolkata')):
+            interview_calendar = InterviewCalendar.objects.create(description=description, timezone=tz,
+                                                                  min_hours_notice=0, max_hours_out=24 * 30)
+            for hour in (9, 13):
+                InterviewSlot.objects.create(calendar=interview_calendar, start_time=time(hour=hour, minute=15),
+                                             end_time=time(hour=hour + 1), monday=True, tuesday=True,
+                                             wednesday=True, thursday=True, friday=True, max_spots=2)
+        self.params = {
+            'startDate': self.start_date.isoformat(),
+            'endDate': (self.start_date + timedelta(days=13)).isoformat(),
+        }
+
+    def get_drf_slots(self, interview_calendar):
+        engine = AvailabilityEngine(interview_calendar, self.start_date, self.start_date + timedelta(days=13))
+        return [
+            data
+            for interview_date, slots in engine.get_slots_by_date()
+            for data in InterviewSlotSerializer(slots, many=True, context={'date': interview_date}).data
+        ]
+
+    def test_calendar_list_matches_drf_renderer_bytes(self):
+        response = self.client.get('/calendars/', self.params)
+        self.assertEqual(response.status_code, 200)
+        expected = JSONRenderer().render({
+            'next': None,
+            'results': [
+                OrderedDict([('id', interview_calendar.pk), ('description', interview_calendar.description),
+                             ('slots', self.get_drf_slots(interview_calendar)),
+                             ('timezone', interview_calendar.timezone)])
+                for interview_calendar in InterviewCalendar.objects.order_by('id')
+            ],
+        })
+        self.assertEqual(response.content, expected)
+        self.assertIn(b'Z\xc3\xbcrich \\u2028', response.content)
+
+    def test_renderer_matches_json_renderer_for_plain_data(self):
+        data = OrderedDict([('a', [1, 2.5, None, True]), ('b', {'c': '\u00fc\u2029'}), (3, ())])
+        self.assertEqual(AvailabilityJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(AvailabilityJSONRenderer().render(data, 'application/json; indent=4'),
+                         JSONRenderer().render(data, 'application/json; indent=4'))
+
+    def test_streamed_calendars_match_paginated_results(self):
+        results = json.loads(self.client.get('/calendars/', self.params).content.decode('utf-8'))['results']
+        response = self.client.get('/calendars/', dict(self.params, stream='true'))
+        self.assertEqual(json.loads(b''.join(response.streaming_content).decode('utf-8')), results)
+
+
+class ReplicaRouterTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.interview_calendar = InterviewCalendar.objects.create(description = "US NorthEast Zone",
+                                                                   timezone = "US/Eastern", min_hours_notice = 0,
+                                                                   max_hours_out = 24 * 30)
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(InterviewCalendar.objects.get(pk=self.interview_calendar.pk)._state.db, 'replica')
+        self.assertEqual(router.db_for_write(InterviewCalendar), 'default')
+
+    def test_primary_reads_within_transactions_and_use_primary(self):
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(InterviewCalendar), 'default')
+        with use_primary():
+            self.assertEqual(InterviewCalendar.objects.get(pk=self.interview_calendar.pk)._state.db, 'default')
+        self.assertEqual(router.db_for_read(InterviewCalendar), 'replica')
+
+    def test_writes_pin_client_to_primary(self):
+        reads = []
+
+        def get_response(request):
+            reads.append(router.db_for_read(InterviewCalendar))
+            return HttpResponse()
+
+        middleware = ReplicaStickinessMiddleware(get_response)
+        response = middleware(RequestFactory().post('/interviews/'))
+        cookie = response.cookies[ReplicaStickinessMiddleware.cookie_name]
+
+        request = RequestFactory().get('/calendars/')
+        request.COOKIES[cookie.key] = cookie.value
+        middleware(request)
+        middleware(RequestFactory().get('/calendars/'))
+
+        self.assertEqual(reads, ['replica', 'default', 'replica'])
+        self.assertEqual(router.db_for_read(InterviewCalendar), 'replica')
+
+    def get_cached_days(self, calendar, start_date, end_date, now):
+        availability = AvailabilityCache()
+        keys = availability.get_entry_keys(calendar.pk, AvailabilityEngine(calendar, start_date, end_date,
+                                                                           now=now).dates())
+        return len(cache.get_many(list(keys.values())))
+
+    def test_cached_days_are_computed_on_replica(self):
+        InterviewSlot.objects.create(calendar = self.interview_calendar, start_time = time(hour=14),
+                                     end_time = time(hour=16), monday = True, max_spots = 1)
+        now = timezone.now()
+        start_date = now.date()
+        end_date = start_date + timedelta(days=6)
+
+        reads = []
+        get_openings_for_date = AvailabilityEngine.get_openings_for_date
+
+        def record_read(engine, date):
+            reads.append(router.db_for_read(InterviewSlot))
+            return get_openings_for_date(engine, date)
+
+        for lag in (0, 1):
+            cache.clear()
+            availability = AvailabilityCache()
+            calendar = InterviewCalendar.objects.get(pk=self.interview_calendar.pk)
+            # a lagging replica returns the calendar before the latest write
+            calendar.version -= lag
+            availability.prefetch([calendar], start_date, end_date, now=now)
+            with patch.object(AvailabilityEngine, 'get_openings_for_date', record_read):
+                list(availability.get_openings_by_date(calendar, start_date, end_date, now=now))
+
+            self.assertEqual({slot._state.db for slot in calendar.window_slots}, {'replica'})
+            cached = self.get_cached_days(calendar, start_date, end_date, now)
+            self.assertEqual(cached, 0 if lag else len(list(AvailabilityEngine(
+                calendar, start_date, end_date, now=now).dates())))
+
+        self.assertEqual(set(reads), {'replica'})
+
+
+class PooledConnection():
+
+    def __init__(self):
+        self.closed = False
+        self.usable = True
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTestCase(TestCase):
+
+    def get_pool(self, **kwargs):
+        return ConnectionPool(PooledConnection, **kwargs)
+
+    def test_released_connections_are_reused(self):
+        pool = self.get_pool(max_size=2)
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        self.assertIsNot(pool.acquire(), first)
+        self.assertEqual(pool.stats.as_dict()['connects'], 2)
+
+    def test_checkout_waits_for_release(self):
+        pool = self.get_pool(max_size=1, timeout=5)
+        connection = pool.acquire()
+        threading.Timer(0.05, pool.release, [connection]).start()
+        self.assertIs(pool.acquire(), connection)
+        self.assertGreater(pool.stats.wait_max, 0.03)
+
+    def test_checkout_times_out(self):
+        pool = self.get_pool(max_size=1, timeout=0.01)
+        pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(pool.stats.as_dict()['timeouts'], 1)
+
+    def test_broken_and_expired_connections_are_replaced(self):
+        pool = self.get_pool(max_size=2, health_check=lambda connection: connection.usable)
+        broken, expired = pool.acquire(), pool.acquire()
+        broken.usable = False
+        pool.release(broken)
+        self.assertIsNot(pool.acquire(), broken)
+        self.assertTrue(broken.closed)
+        self.assertEqual(pool.stats.failed_checks, 1)
+
+        pool.max_idle = 0
+        pool.release(expired)
+        self.assertIsNot(pool.acquire(), expired)
+        self.assertTrue(expired.closed)
+
+
+class LocalTimeTableTestCase(TestCase):
+
+    def test_localize_matches_pytz_across_dst_transitions(self):
+        for name in ('US/Eastern', 'Australia/Lord_Howe', 'UTC'):
+            tz = pytz.timezone(name)
+            table = LocalTimeTable(get_timezone(name), date(2017, 1, 1), date(2017, 12, 31))
+            current = date(2017, 1, 1)
+            while current <= date(2017, 12, 31):
+                for local_time in (time(0), time(1, 30), time(2, 30), time(14), time(23, 59)):
+                    expected = tz.localize(datetime.combine(current, local_time))
+                    result = table.localize(current, local_time)
+                    self.assertEqual(result.isoformat(), expected.isoformat())
+                current = current + timedelta(days=1)
+
+    def test_transition_dates_fall_back_to_pytz(self):
+        table = LocalTimeTable(get_timezone('US/Eastern'), date(2017, 3, 11), date(2017, 3, 13))
+        self.assertEqual(sorted(table.tzinfos), [date(2017, 3, 11), date(2017, 3, 13)])
+
@@ -2,28 +2,174 @@
 # companies/views.py
 # *****************************************************************************
 
+import hashlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags, quote_etag
 
 from rest_framework import mixins
+from rest_framework import status
 from rest_framework import viewsets
-from rest_framework.decorators import list_route
+from rest_framework.decorators import detail_route, list_route
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
+from scheduler.helpers.AvailabilityCache import AvailabilityCache
+from scheduler.helpers.AvailabilityMaterializer import AvailabilityMaterializer
+from scheduler.helpers.AvailabilityMaterializer import is_enabled as is_materialized
+from scheduler.helpers.BulkBookingHandler import MAX_BULK_BOOKINGS, BulkBookingHandler
+from scheduler.helpers.ConflictImporter import ConflictImporter
+from scheduler.helpers.NextAvailableSearch import (
+    MAX_NEXT_AVAILABLE,
+    MAX_SEARCH_CALENDARS,
+    NextAvailableSearch,
+)
+from scheduler.helpers.Opening import OpeningList
+from scheduler.pagination import (
+    InterviewCalendarPagination,
+    InterviewPagination,
+    iterate_keyset,
+)
+from scheduler.renderers import AvailabilityJSONRenderer
 from .models import (
     InterviewCalendar,
+    InterviewConflict,
     Interview
 )
 
 from .serializers import (
     InterviewCalendarSerializer,
+    InterviewConflictSerializer,
     InterviewSerializer
 )
 
+# *****************************************************************************
+# StreamingListMixin
+# *****************************************************************************
+
+class StreamingListMixin():
+
+    """
+    lists with ?stream=true return every row as a streamed JSON array,
+    fetched and serialized in keyset chunks of the pagination ordering so
+    memory stays flat regardless of table size
+
+    """
+
+    stream_chunk_size = 500
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('stream') not in ('1', 'true'):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        chunks = iterate_keyset(
+            queryset,
+            self.pagination_class.ordering,
+            self.stream_chunk_size,
+        )
+
+        return StreamingHttpResponse(
+            self.stream_rows(chunks),
+            content_type='application/json',
+        )
+
+    def stream_rows(self, chunks):
+        renderer = self.renderer_classes[0]()
+        separator = b'['
+        for chunk in chunks:
+            for row in self.get_serializer(chunk, many=True).data:
+                yield separator + renderer.render(row)
+                separator = b','
+
+        yield b']' if separator == b',' else b'[]'
+
+# *****************************************************************************
+# QueryParamsMixin
+# *****************************************************************************
+
+class QueryParamsMixin():
+
+    """
+    parses typed query parameters, invalid values are 400 responses
+
+    """
+
+    def get_datetime_param(self, name):
+
+        """
+        parses an ISO datetime query parameter, naive values are read in the
+        default timezone
+
+        """
+
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: 'Expected an ISO 8601 datetime.'})
+
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+
+        return parsed
+
+    def get_count_param(self, name, default, maximum):
+
+        """
+        parses a positive integer query parameter of at most maximum
+
+        """
+
+        value = self.request.query_params.get(name)
+        if value is None:
+            return default
+
+        try:
+            count = int(value)
+        except ValueError:
+            count = 0
+        if not 0 < count <= maximum:
+            raise ValidationError({name: 'Expected an integer from 1 to {}.'.format(maximum)})
+
+        return count
+
+    def get_ids_param(self, name, maximum):
+
+        """
+        parses a required query parameter of comma separated ids, at most
+        maximum of them
+
+        """
+
+        try:
+            ids = [int(value) for value in self.request.query_params.get(name, '').split(',')]
+        except ValueError:
+            ids = []
+        if not 0 < len(ids) <= maximum:
+            raise ValidationError({name: 'Expected 1 to {} comma separated ids.'.format(maximum)})
+
+        return list(OrderedDict.fromkeys(ids))
+
+
 # *****************************************************************************
 # InterviewCalendarViewSet
 # *****************************************************************************
 
 class InterviewCalendarViewSet(
+        QueryParamsMixin,
+        StreamingListMixin,
         mixins.ListModelMixin,
         mixins.RetrieveModelMixin,
         viewsets.GenericViewSet):
@@ -35,6 +181,115 @@ class InterviewCalendarViewSet(
 
     serializer_class = InterviewCalendarSerializer
     queryset = InterviewCalendar.objects.all()
+    pagination_class = InterviewCalendarPagination
+    renderer_classes = (AvailabilityJSONRenderer, BrowsableAPIRenderer)
+
+    def get_serializer(self, *args, **kwargs):
+
+        """
+        prefetches the data needed to compute available interview times of
+        calendars that are not cached yet
+
+        """
+
+        start_date = parse_date(self.request.query_params.get('startDate', ''))
+        end_date = parse_date(self.request.query_params.get('endDate', ''))
+
+        if args and start_date and end_date:
+            calendars = args[0] if kwargs.get('many') else [args[0]]
+            if is_materialized():
+                materializer = AvailabilityMaterializer()
+                calendars = [calendar for calendar in calendars if not materializer.is_fresh(calendar)]
+            AvailabilityCache().prefetch(calendars, start_date, end_date)
+
+        return super().get_serializer(*args, **kwargs)
+
+    def get_etag(self, calendar):
+
+        """
+        returns the ETag of a calendar response, derived from the calendar
+        version, the query, the response format and the current time
+        interval, as available times depend on the current time
+
+        """
+
+        interval = int(timezone.now().timestamp()) // getattr(settings, 'SCHEDULER_ETAG_INTERVAL', 60)
+        token = '{}:{}:{}:{}:{}:{}'.format(
+            calendar.pk,
+            calendar.version,
+            calendar.updated.isoformat(),
+            interval,
+            self.request.accepted_renderer.format,
+            self.request.get_full_path(),
+        )
+
+        return hashlib.sha1(token.encode('utf-8')).hexdigest()
+
+    def retrieve(self, request, *args, **kwargs):
+
+        """
+        answers If-None-Match requests with 304 Not Modified while the
+        calendar is unchanged, without computing availability
+
+        """
+
+        calendar = self.get_object()
+        etag = quote_etag(self.get_etag(calendar))
+
+        # If-None-Match uses the weak comparison
+        if_none_match = {
+            tag[2:] if tag.startswith('W/') else tag
+            for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        }
+        if etag in if_none_match or '*' in if_none_match:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(self.get_serializer(calendar).data)
+
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    @list_route(methods=['get'], url_path='earliest-available')
+    def earliest_available(self, request):
+
+        """
+        returns the first count (1 by default) bookable slots across the
+        comma separated calendar ids starting after the after datetime, or
+        now
+
+        """
+
+        calendar_ids = self.get_ids_param('calendars', MAX_SEARCH_CALENDARS)
+        calendars = self.get_queryset().in_bulk(calendar_ids)
+        missing = [calendar_id for calendar_id in calendar_ids if calendar_id not in calendars]
+        if missing:
+            raise ValidationError({'calendars': 'Unknown calendars: {}.'.format(', '.join(map(str, missing)))})
+
+        search = NextAvailableSearch(calendars.values(), after=self.get_datetime_param('after'))
+        openings = search.first(self.get_count_param('count', 1, MAX_NEXT_AVAILABLE))
+
+        return Response(OrderedDict([
+            ('slots', OpeningList(openings)),
+        ]))
+
+    @detail_route(methods=['get'], url_path='next-available')
+    def next_available(self, request, pk=None):
+
+        """
+        returns the first count (1 by default) bookable slots of the calendar
+        starting after the after datetime, or now
+
+        """
+
+        calendar = self.get_object()
+        search = NextAvailableSearch([calendar], after=self.get_datetime_param('after'))
+        openings = search.first(self.get_count_param('count', 1, MAX_NEXT_AVAILABLE))
+
+        return Response(OrderedDict([
+            ('id', calendar.pk),
+            ('slots', OpeningList(openings)),
+        ]))
 
     def get_serializer_context(self):
 
@@ -56,6 +311,8 @@ class InterviewCalendarViewSet(
 # *****************************************************************************
 
 class InterviewViewSet(
+        QueryParamsMixin,
+        StreamingListMixin,
         mixins.CreateModelMixin,
         mixins.ListModelMixin,
         mixins.RetrieveModelMixin,
@@ -68,6 +325,71 @@ class InterviewViewSet(
 
     serializer_class = InterviewSerializer
     queryset = Interview.objects.all()
+    pagination_class = InterviewPagination
+
+    def get_queryset(self):
+
+        """
+        filters interviews by the calendar, start and end (ISO datetimes
+        bounding start_time) and canceled query parameters
+
+        """
+
+        params = self.request.query_params
+        queryset = super().get_queryset()
+
+        if 'calendar' in params:
+            try:
+                queryset = queryset.filter(calendar_id=int(params['calendar']))
+            except ValueError:
+                raise ValidationError({'calendar': 'Expected a calendar id.'})
+
+        queryset = queryset.starting_between(
+            self.get_datetime_param('start'),
+            self.get_datetime_param('end'),
+        )
+
+        if 'canceled' in params:
+            canceled = params['canceled'].lower()
+            if canceled not in ('true', 'false', '1', '0'):
+                raise ValidationError({'canceled': 'Expected true or false.'})
+            queryset = queryset.filter(canceled=canceled in ('true', '1'))
+
+        return queryset
+
+    @list_route(methods=['post'], url_path='bulk')
+    def bulk(self, request):
+
+        """
+        books a list of interviews in one request and reports the outcome of
+        each in request order
+
+        """
+
+        if not isinstance(request.data, list):
+            raise ValidationError('Expected a list of interviews.')
+        if len(request.data) > MAX_BULK_BOOKINGS:
+            raise ValidationError('At most {} interviews can be booked at once.'.format(MAX_BULK_BOOKINGS))
+
+        results = [None] * len(request.data)
+        positions = []
+        validated = []
+        for position, item in enumerate(request.data):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                positions.append(position)
+                validated.append(serializer.validated_data)
+            else:
+                results[position] = {'status': 'rejected', 'errors': serializer.errors}
+
+        booked = BulkBookingHandler(validated).book()
+        for position, (interview, error) in zip(positions, booked):
+            if interview is None:
+                results[position] = {'status': 'rejected', 'errors': {'non_field_errors': [error]}}
+            else:
+                results[position] = {'status': 'booked', 'interview': self.get_serializer(interview).data}
+
+        return Response(results)
 
     def perform_create(self, serializer):
 
@@ -77,3 +399,40 @@ class InterviewViewSet(
         """
 
         return serializer.save()
+
+# *****************************************************************************
+# InterviewConflictViewSet
+# *****************************************************************************
+
+class InterviewConflictViewSet(viewsets.GenericViewSet):
+
+    """
+    a ViewSet to import InterviewConflicts
+
+    """
+
+    serializer_class = InterviewConflictSerializer
+    queryset = InterviewConflict.objects.all()
+
+    @list_route(methods=['post'], url_path='import')
+    def import_conflicts(self, request):
+
+        """
+        imports a list of conflicts, coalescing overlapping and touching
+        ranges of each calendar into the fewest conflicts
+
+        """
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        importer = ConflictImporter()
+        for conflict in serializer.validated_data:
+            importer.add(conflict['calendar_id'], conflict['start_time'], conflict['end_time'])
+
+        try:
+            stats = importer.save()
+        except InterviewCalendar.DoesNotExist as e:
+            raise ValidationError({'calendar': [str(e)]})
+
+        return Response(stats)
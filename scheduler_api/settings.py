@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'scheduler.middleware.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'scheduler_api.urls'
@@ -75,20 +76,88 @@ WSGI_APPLICATION = 'scheduler_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases
 
+# POSTGRES_POOL_SIZE > 0 checks connections out of a pool of that size per
+# process instead of keeping one persistent connection per thread, see
+# scheduler/backends/postgresql_pool/base.py
+POSTGRES_POOL_SIZE = int(os.environ.get('POSTGRES_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': 'scheduler.backends.postgresql_pool',
         'NAME': os.environ.get('POSTGRES_NAME', 'postgres'),
         'USER': os.environ.get('POSTGRES_USER', 'postgres'),
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
         'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
-        'PORT': 5432,
+        'PORT': int(os.environ.get('POSTGRES_PORT', 5432)),
+        'CONN_MAX_AGE': 0 if POSTGRES_POOL_SIZE else int(os.environ.get('POSTGRES_CONN_MAX_AGE', 60)),
+        'HEALTH_CHECKS': os.environ.get('POSTGRES_HEALTH_CHECKS', '1') == '1',
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('POSTGRES_CONNECT_TIMEOUT', 5)),
+        },
+        'POOL': {
+            'MAX_SIZE': POSTGRES_POOL_SIZE,
+            'TIMEOUT': float(os.environ.get('POSTGRES_POOL_TIMEOUT', 5)),
+            'MAX_IDLE': float(os.environ.get('POSTGRES_POOL_MAX_IDLE', 5 * 60)),
+        },
     },
 }
 
+# availability reads go to a read replica at POSTGRES_REPLICA_HOST when set,
+# see scheduler/routers.py
+if os.environ.get('POSTGRES_REPLICA_HOST'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        HOST=os.environ['POSTGRES_REPLICA_HOST'],
+        PORT=int(os.environ.get('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT'])),
+        TEST={'MIRROR': 'default'},
+    )
+
 if 'test' in sys.argv:
     DATABASES['default']['ENGINE'] = 'django.db.backends.sqlite3'
     DATABASES['default']['NAME'] = os.path.join(BASE_DIR, 'db.sqlite3')
+    DATABASES['default']['OPTIONS'] = {}
+    DATABASES['replica'] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['scheduler.routers.ReplicaRouter']
+
+# reads of a client go to the primary for this many seconds after it wrote
+SCHEDULER_REPLICA_STICKINESS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+
+# per day availability cache, see scheduler/helpers/AvailabilityCache.py
+SCHEDULER_AVAILABILITY_CACHE = 'default'
+SCHEDULER_AVAILABILITY_CACHE_TIMEOUT = 24 * 60 * 60
+
+# calendar ETags change at least this often, as slots move past the booking
+# horizon with time
+SCHEDULER_ETAG_INTERVAL = 60
+
+# read calendar availability from the AvailableOccurrence rows kept by the
+# refresh_availability command, which refreshes every calendar at least
+# every SCHEDULER_MATERIALIZE_INTERVAL seconds
+SCHEDULER_MATERIALIZED_AVAILABILITY = os.environ.get('SCHEDULER_MATERIALIZED_AVAILABILITY', '') == '1'
+SCHEDULER_MATERIALIZE_INTERVAL = 5 * 60
+
+# queries loading availability data for calendar listings run on a thread
+# pool of this size per process, 1 runs them one after the other in the
+# request thread
+SCHEDULER_FETCH_CONCURRENCY = int(os.environ.get('SCHEDULER_FETCH_CONCURRENCY', 4))
 
 
 # Password validation
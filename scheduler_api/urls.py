@@ -14,6 +14,7 @@ from scheduler import views
 
 router = SimpleRouter()
 router.register(r'calendars', views.InterviewCalendarViewSet)
+router.register(r'conflicts', views.InterviewConflictViewSet)
 router.register(r'interviews', views.InterviewViewSet)
 
 urlpatterns = [